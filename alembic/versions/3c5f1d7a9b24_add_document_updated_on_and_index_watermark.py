@@ -0,0 +1,40 @@
+"""add document updated_on and index watermark
+
+Revision ID: 3c5f1d7a9b24
+Revises: 69e2fac34d21
+Create Date: 2026-10-18 14:21:37.190245
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c5f1d7a9b24'
+down_revision: Union[str, None] = '69e2fac34d21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('indexwatermark',
+    sa.Column('name', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('watermark', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.add_column('documents', sa.Column('updated_on', sa.DateTime(), nullable=True))
+    op.execute("UPDATE documents SET updated_on = created_on")
+    with op.batch_alter_table('documents') as batch_op:
+        batch_op.alter_column('updated_on', existing_type=sa.DateTime(), nullable=False)
+    op.create_index(op.f('ix_documents_updated_on'), 'documents', ['updated_on'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_documents_updated_on'), table_name='documents')
+    op.drop_column('documents', 'updated_on')
+    op.drop_table('indexwatermark')
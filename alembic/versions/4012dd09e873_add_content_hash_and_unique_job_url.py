@@ -0,0 +1,57 @@
+"""add content hash and unique job url
+
+Revision ID: 4012dd09e873
+Revises: 9766a54518a3
+Create Date: 2026-10-18 11:02:15.804412
+
+"""
+import hashlib
+import re
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4012dd09e873'
+down_revision: Union[str, None] = '9766a54518a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _hash_text(text: str) -> str:
+    # same normalization as app.hashing.hash_text, frozen for this revision
+    normalized = re.sub(r"\s+", " ", text).strip().casefold()
+    return hashlib.sha256(normalized.encode("utf8")).hexdigest()
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    connection = op.get_bind()
+
+    op.add_column('documents', sa.Column('content_hash', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+    # backfill; only the oldest copy of duplicated content keeps the hash
+    seen = set()
+    for doc_id, content in connection.execute(
+            sa.text("SELECT doc_id, content FROM documents ORDER BY doc_id")):
+        content_hash = _hash_text(content)
+        if content_hash in seen:
+            continue
+        seen.add(content_hash)
+        connection.execute(sa.text("UPDATE documents SET content_hash = :content_hash WHERE doc_id = :doc_id"),
+                           {"content_hash": content_hash, "doc_id": doc_id})
+    op.create_index(op.f('ix_documents_content_hash'), 'documents', ['content_hash'], unique=True)
+
+    # keep the oldest row per job url before enforcing uniqueness
+    connection.execute(sa.text(
+        "DELETE FROM jobs WHERE job_id NOT IN (SELECT MIN(job_id) FROM jobs GROUP BY job_url)"))
+    op.create_index(op.f('ix_jobs_job_url'), 'jobs', ['job_url'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_jobs_job_url'), table_name='jobs')
+    op.drop_index(op.f('ix_documents_content_hash'), table_name='documents')
+    op.drop_column('documents', 'content_hash')
@@ -0,0 +1,65 @@
+"""add hnsw index to embeddings
+
+Revision ID: 69e2fac34d21
+Revises: 8202339f3e21
+Create Date: 2026-10-18 12:25:09.640371
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from pgvector.sqlalchemy import Vector
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '69e2fac34d21'
+down_revision: Union[str, None] = '8202339f3e21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# all-MiniLM-L6-v2
+EMBEDDING_DIMENSION = 384
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 64
+
+
+def upgrade() -> None:
+    """Fix the embedding dimension and add an HNSW cosine index to the PGVector table."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS vector")
+    tables = sa.inspect(op.get_bind()).get_table_names()
+
+    # the tables are normally created by langchain_postgres; create them here on a fresh database
+    if 'langchain_pg_collection' not in tables:
+        op.create_table('langchain_pg_collection',
+        sa.Column('uuid', sa.UUID(), nullable=False),
+        sa.Column('name', sa.VARCHAR(), nullable=False),
+        sa.Column('cmetadata', postgresql.JSON(astext_type=sa.Text()), nullable=True),
+        sa.PrimaryKeyConstraint('uuid', name='langchain_pg_collection_pkey'),
+        sa.UniqueConstraint('name', name='langchain_pg_collection_name_key')
+        )
+    if 'langchain_pg_embedding' not in tables:
+        op.create_table('langchain_pg_embedding',
+        sa.Column('id', sa.VARCHAR(), nullable=False),
+        sa.Column('collection_id', sa.UUID(), nullable=True),
+        sa.Column('embedding', Vector(EMBEDDING_DIMENSION), nullable=True),
+        sa.Column('document', sa.VARCHAR(), nullable=True),
+        sa.Column('cmetadata', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.ForeignKeyConstraint(['collection_id'], ['langchain_pg_collection.uuid'], name='langchain_pg_embedding_collection_id_fkey', ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id', name='langchain_pg_embedding_pkey')
+        )
+        op.create_index('ix_cmetadata_gin', 'langchain_pg_embedding', ['cmetadata'], unique=False, postgresql_using='gin')
+    else:
+        # HNSW needs a fixed dimension; existing rows are all MiniLM vectors
+        op.execute(f"ALTER TABLE langchain_pg_embedding ALTER COLUMN embedding "
+                   f"TYPE vector({EMBEDDING_DIMENSION}) USING embedding::vector({EMBEDDING_DIMENSION})")
+
+    op.execute(f"CREATE INDEX IF NOT EXISTS ix_langchain_pg_embedding_hnsw ON langchain_pg_embedding "
+               f"USING hnsw (embedding vector_cosine_ops) WITH (m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION})")
+
+
+def downgrade() -> None:
+    """Drop the HNSW index and the fixed dimension."""
+    op.execute("DROP INDEX IF EXISTS ix_langchain_pg_embedding_hnsw")
+    op.execute("ALTER TABLE langchain_pg_embedding ALTER COLUMN embedding TYPE vector")
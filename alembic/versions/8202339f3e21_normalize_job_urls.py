@@ -0,0 +1,62 @@
+"""normalize job urls
+
+Revision ID: 8202339f3e21
+Revises: 4012dd09e873
+Create Date: 2026-10-18 11:40:52.117903
+
+"""
+from typing import Sequence, Union
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8202339f3e21'
+down_revision: Union[str, None] = '4012dd09e873'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# frozen copy of app.job_urls for this revision
+TRACKING_PARAMS = {"refId", "trackingId", "position", "pageNum", "trk", "trkInfo", "lipi",
+                   "originalSubdomain", "eBP", "midToken", "midSig", "currentJobId"}
+
+
+def _normalize_job_url(url: str) -> str:
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host == "linkedin.com" or host.endswith(".linkedin.com"):
+        host = "www.linkedin.com"
+    query = urlencode([(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                       if key not in TRACKING_PARAMS and not key.startswith("utm_")])
+    return urlunsplit(("https", host, parts.path.rstrip("/"), query, ""))
+
+
+def upgrade() -> None:
+    """Rewrite jobs.job_url to its normalized form so the unique index covers tracking variants."""
+    connection = op.get_bind()
+    rows = connection.execute(sa.text("SELECT job_id, job_url FROM jobs ORDER BY job_id")).all()
+
+    keep = {}
+    duplicates = []
+    for job_id, job_url in rows:
+        normalized = _normalize_job_url(job_url)
+        if normalized in keep:
+            duplicates.append(job_id)
+        else:
+            keep[normalized] = (job_id, job_url)
+
+    # drop duplicates first so the updates cannot collide on ix_jobs_job_url
+    if duplicates:
+        connection.execute(sa.text("DELETE FROM jobs WHERE job_id IN :ids").bindparams(
+            sa.bindparam("ids", expanding=True)), {"ids": duplicates})
+    for normalized, (job_id, job_url) in keep.items():
+        if normalized != job_url:
+            connection.execute(sa.text("UPDATE jobs SET job_url = :job_url WHERE job_id = :job_id"),
+                               {"job_url": normalized, "job_id": job_id})
+
+
+def downgrade() -> None:
+    """Tracking parameters cannot be restored; nothing to undo."""
+    pass
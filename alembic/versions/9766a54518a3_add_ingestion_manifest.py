@@ -0,0 +1,43 @@
+"""add ingestion manifest
+
+Revision ID: 9766a54518a3
+Revises: e90024344892
+Create Date: 2026-10-18 10:12:41.532118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9766a54518a3'
+down_revision: Union[str, None] = 'e90024344892'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('ingestionmanifest',
+    sa.Column('manifest_id', sa.Integer(), nullable=False),
+    sa.Column('file_name', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('file_hash', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('text_hash', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('doc_id', sa.Integer(), nullable=True),
+    sa.Column('processed_on', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['doc_id'], ['documents.doc_id'], ),
+    sa.PrimaryKeyConstraint('manifest_id'),
+    sa.UniqueConstraint('file_name')
+    )
+    op.create_index(op.f('ix_ingestionmanifest_file_hash'), 'ingestionmanifest', ['file_hash'], unique=False)
+    op.create_index(op.f('ix_ingestionmanifest_text_hash'), 'ingestionmanifest', ['text_hash'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_ingestionmanifest_text_hash'), table_name='ingestionmanifest')
+    op.drop_index(op.f('ix_ingestionmanifest_file_hash'), table_name='ingestionmanifest')
+    op.drop_table('ingestionmanifest')
@@ -0,0 +1,44 @@
+import asyncio
+import random
+from typing import Awaitable, Callable, TypeVar
+
+import openai
+
+T = TypeVar("T")
+
+DEFAULT_RETRIES = 5
+BASE_DELAY = 1.0
+MAX_DELAY = 60.0
+# what the OpenAI client itself would retry: rate limits, 5xx and connection errors / timeouts
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError)
+
+
+def _retry_after(error: openai.APIError) -> float | None:
+    """ seconds to wait as suggested by the API, if any """
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    value = response.headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+async def with_backoff(call: Callable[[], Awaitable[T]], retries: int = DEFAULT_RETRIES,
+                       base_delay: float = BASE_DELAY, max_delay: float = MAX_DELAY) -> T:
+    """
+    Await call(), retrying on rate-limit, server and connection errors with exponential backoff and jitter.
+    Honours the retry-after header when the API sends one. Meant as the only retry layer:
+    the model behind call() should be built with max_retries=0.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return await call()
+        except RETRYABLE_ERRORS as e:
+            if attempt == retries:
+                raise
+            delay = _retry_after(e) or min(max_delay, base_delay * 2 ** attempt)
+            delay *= random.uniform(0.8, 1.2)
+            print(f"{type(e).__name__}, retrying in {delay:.1f}s (attempt {attempt + 1}/{retries})")
+            await asyncio.sleep(delay)
@@ -0,0 +1,113 @@
+import os
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+import tiktoken
+from dotenv import load_dotenv
+from langchain_core.documents import Document
+from pydantic import BaseModel
+
+from app.hashing import hash_text
+
+CHARS_PER_TOKEN = 4  # estimate when no tokenizer is available
+DEFAULT_BUDGETS = {
+    "job_description": 800,
+    "requirements": 600,
+    "nice_to_haves": 300,
+    "experiences": 400,
+    "cleaning_input": 2000,  # document text sent to the cleaning call at ingestion
+}
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    """ tokenizer for the model, None if it cannot be loaded (e.g. offline without a cached BPE file) """
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        print(f"Tokenizer for {model} unavailable ({type(e).__name__}), estimating tokens from characters")
+        return None
+
+
+class ContextBuilder:
+    """
+    Assembles prompt context within per-section token budgets.
+    Retrieved chunks are deduplicated (across sections too), ranked by similarity and packed
+    best first until the section budget is used; free text is truncated to its budget.
+    Budgets can be overridden per section with CONTEXT_BUDGET_<SECTION> (e.g. CONTEXT_BUDGET_REQUIREMENTS).
+    """
+
+    def __init__(self, model: str = "gpt-4o-mini", budgets: Dict[str, int] | None = None):
+        load_dotenv()
+        self.model = model
+        self.budgets = {section: int(os.getenv(f"CONTEXT_BUDGET_{section.upper()}", budget))
+                        for section, budget in DEFAULT_BUDGETS.items()}
+        self.budgets.update(budgets or {})
+
+    def count(self, text: str) -> int:
+        encoding = _encoding(self.model)
+        if encoding is None:
+            return -(-len(text) // CHARS_PER_TOKEN)
+        return len(encoding.encode(text))
+
+    def truncate(self, text: str, budget: int) -> str:
+        """ the longest prefix of text within budget tokens """
+        encoding = _encoding(self.model)
+        if encoding is None:
+            return text[:budget * CHARS_PER_TOKEN]
+        tokens = encoding.encode(text)
+        return text if len(tokens) <= budget else encoding.decode(tokens[:budget])
+
+    @staticmethod
+    def describe(model: BaseModel) -> str:
+        """ compact 'field: value' rendering of a structured model, empty fields left out """
+        return "\n".join(f"{field}: {value}" for field, value in model.model_dump().items() if value)
+
+    def pack(self, matches: List[Tuple[Document, float]], budget: int, seen: set | None = None) -> str:
+        """
+        Bullet list of the best-scoring unique chunks that fit into budget tokens.
+        seen collects content hashes already used, so chunks are not repeated in later sections.
+        """
+        seen = set() if seen is None else seen
+        best: Dict[str, Tuple[Document, float]] = {}
+        for document, score in matches:
+            key = hash_text(document.page_content)
+            if key not in seen and (key not in best or score > best[key][1]):
+                best[key] = (document, score)
+
+        lines, used = [], 0
+        for key, (document, _) in sorted(best.items(), key=lambda item: item[1][1], reverse=True):
+            line = f"- {' '.join(document.page_content.split())}"
+            tokens = self.count(line) + 1
+            if used + tokens > budget:
+                if lines:
+                    continue
+                line = self.truncate(line, budget)
+                tokens = budget
+            lines.append(line)
+            used += tokens
+            seen.add(key)
+        return "\n".join(lines)
+
+    def build(self, sections: Dict[str, List[Tuple[Document, float]] | str | BaseModel]) -> Dict[str, str]:
+        """
+        Render every section within its budget: retrieval results are packed, models described,
+        text truncated. Sections without a budget are passed through unchanged.
+        """
+        seen = set()
+        context = {}
+        for section, value in sections.items():
+            budget = self.budgets.get(section)
+            if isinstance(value, BaseModel):
+                value = self.describe(value)
+            if budget is None:
+                context[section] = value if isinstance(value, str) else str(value)
+            elif isinstance(value, str):
+                context[section] = self.truncate(value, budget)
+            else:
+                context[section] = self.pack(value, budget, seen)
+        for section, text in context.items():
+            print(f"Context {section}: {self.count(text)} tokens")
+        return context
@@ -0,0 +1,131 @@
+import asyncio
+import os
+import time
+from typing import List
+
+from dotenv import load_dotenv
+from langchain_core.messages import SystemMessage
+from pydantic import BaseModel
+
+from app.instrumentation import tracer
+from app.registry import get_chat_model
+from db.schemas import AIResponse, EvaluateCoverLetter
+
+DEFAULT_CANDIDATES = 3
+DEFAULT_MAX_ROUNDS = 3
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_TOKEN_BUDGET = 60_000
+SCORE_FIELDS = [field for field in EvaluateCoverLetter.model_fields if field != "result"]
+
+
+class Candidate(BaseModel):
+    letter: AIResponse
+    text: str
+    evaluation: EvaluateCoverLetter
+    round: int
+
+
+class CoverLetterRefiner:
+    """
+    Generate-and-evaluate loop for the cover letter.
+    Each round drafts several candidates concurrently, scores them concurrently and keeps the best so far.
+    It stops as soon as a candidate reaches the threshold, when the round limit is hit or when another
+    round would exceed the token budget. From the second round on, the best draft and its weakest
+    evaluation fields (with the change since the previous round) are fed back into the prompt.
+    Settings: COVER_LETTER_CANDIDATES, COVER_LETTER_MAX_ROUNDS, COVER_LETTER_THRESHOLD, COVER_LETTER_TOKEN_BUDGET.
+    """
+
+    def __init__(self, handler, candidates: int | None = None, max_rounds: int | None = None,
+                 threshold: float | None = None, token_budget: int | None = None):
+        load_dotenv()
+        self.handler = handler
+        self.candidates = candidates or int(os.getenv("COVER_LETTER_CANDIDATES", DEFAULT_CANDIDATES))
+        self.max_rounds = max_rounds or int(os.getenv("COVER_LETTER_MAX_ROUNDS", DEFAULT_MAX_ROUNDS))
+        self.threshold = threshold if threshold is not None else float(os.getenv("COVER_LETTER_THRESHOLD", DEFAULT_THRESHOLD))
+        self.token_budget = token_budget or int(os.getenv("COVER_LETTER_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET))
+        self.evaluator = get_chat_model(model="gpt-4o-mini", temperature=0, max_retries=3)
+        self.tokens_used = 0
+
+    def _count_tokens(self, responses: List[dict]) -> None:
+        for response in responses:
+            if isinstance(response, Exception):
+                continue
+            usage = getattr(response["raw"], "usage_metadata", None) or {}
+            self.tokens_used += usage.get("total_tokens", 0)
+
+    def _feedback(self, best: Candidate, previous: EvaluateCoverLetter | None) -> str:
+        """ the best draft so far and its fields below the threshold, weakest first """
+        weak_points = []
+        for field in sorted(SCORE_FIELDS, key=lambda name: getattr(best.evaluation, name)):
+            score = getattr(best.evaluation, field)
+            if score >= self.threshold:
+                break
+            change = f", was {getattr(previous, field):.3f}" if previous else ""
+            weak_points.append(f"- {field}: {score:.3f}{change}")
+        return f"""
+        Improve on this previous draft (overall evaluation {best.evaluation.result:.3f}):
+        {best.text}
+        Strengthen in particular these weakly rated areas, using only facts from the context above:
+        {chr(10).join(weak_points) or "- overall persuasiveness"}
+        """
+
+    async def _round(self, prompt: str, round_number: int) -> List[Candidate]:
+        """ draft and score the candidates of one round, each step as one concurrent batch """
+        drafts = await self.handler.llm.with_structured_output(AIResponse, include_raw=True).abatch(
+            [[SystemMessage(content=prompt)]] * self.candidates, return_exceptions=True)
+        self._count_tokens(drafts)
+        letters = []
+        for draft in drafts:
+            if isinstance(draft, Exception):
+                print(f"Draft failed: {draft}")
+            elif draft["parsed"] is not None:
+                letters.append(draft["parsed"])
+        texts = [self.handler.create_cover_letter_file(letter) for letter in letters]
+        evaluations = await self.evaluator.with_structured_output(EvaluateCoverLetter, include_raw=True).abatch(
+            [[SystemMessage(content=self.handler._evaluation_prompt(text))] for text in texts],
+            return_exceptions=True)
+        self._count_tokens(evaluations)
+        candidates = []
+        for letter, text, evaluation in zip(letters, texts, evaluations):
+            if isinstance(evaluation, Exception):
+                print(f"Evaluation failed: {evaluation}")
+            elif evaluation["parsed"] is not None:
+                candidates.append(Candidate(letter=letter, text=text, evaluation=evaluation["parsed"],
+                                            round=round_number))
+        return candidates
+
+    async def arun(self, requirements, nice_to_haves, experiences) -> Candidate:
+        """ the best scoring cover letter within the round and token budgets """
+        start_time = time.time()
+        context = self.handler.cover_letter_context(requirements, nice_to_haves, experiences)
+        best: Candidate | None = None
+        previous: EvaluateCoverLetter | None = None
+        feedback = ""
+        for round_number in range(1, self.max_rounds + 1):
+            round_start_tokens = self.tokens_used
+            with tracer.span("cover_letter.round", round=round_number, candidates=self.candidates):
+                candidates = await self._round(self.handler._cover_letter_prompt(context, feedback), round_number)
+            for candidate in candidates:
+                if best is None or candidate.evaluation.result > best.evaluation.result:
+                    best = candidate
+            scores = ", ".join(f"{candidate.evaluation.result:.3f}" for candidate in candidates)
+            print(f"Round {round_number}: scores [{scores}], best so far "
+                  f"{best.evaluation.result if best else 0:.3f}, {self.tokens_used} tokens used")
+            if best is not None and best.evaluation.result >= self.threshold:
+                print("Threshold reached")
+                break
+            if self.tokens_used + (self.tokens_used - round_start_tokens) > self.token_budget:
+                print("Token budget exhausted")
+                break
+            if best is not None:
+                feedback = self._feedback(best, previous)
+                previous = best.evaluation
+
+        if best is None:
+            raise RuntimeError("No cover letter candidate could be generated and evaluated")
+        print(f"Best cover letter from round {best.round} scored {best.evaluation.result:.3f} "
+              f"({time.time() - start_time:.2f}s, {self.tokens_used} tokens)")
+        return best
+
+    def run(self, requirements, nice_to_haves, experiences) -> Candidate:
+        return asyncio.run(self.arun(requirements, nice_to_haves, experiences))
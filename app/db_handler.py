@@ -1,26 +1,141 @@
 
 from sqlmodel import SQLModel, create_engine, Session, select, inspect
+from datetime import datetime
 
-from db.models import Documents,Jobs
+from db.models import Documents,Jobs,IngestionManifest,IndexWatermark
 from dotenv import load_dotenv
 from pathlib import Path
 import os
-import json
-from typing import List
-
-from db.schemas import DataJobDescription,Match
-
+import threading
+from itertools import islice
+from typing import Iterable, Iterator, List
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.hashing import hash_text
+from app.job_urls import normalize_job_url
+from db.schemas import DataJobDescription,Match,PDFMetadata
+
+
+DEFAULT_POOL_SIZE = 5
+DEFAULT_MAX_OVERFLOW = 10
+DEFAULT_POOL_RECYCLE = 1800
+DEFAULT_EF_SEARCH = 40  # pgvector default; higher = better recall, slower HNSW search
+BULK_CHUNK_SIZE = 500
+
+_engine: Engine | None = None
+_async_engine: AsyncEngine | None = None
+_schema_created = False
+_engine_lock = threading.Lock()
+_schema_lock = threading.Lock()
+
+
+def get_engine() -> Engine:
+    """
+    The process-wide pooled engine, created on first use.
+    Pool settings: DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_RECYCLE (seconds).
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            load_dotenv()
+            db_url = os.getenv("DATABASE_URL")
+            engine_args = {"echo": False, "pool_pre_ping": True}
+            if not db_url.startswith("sqlite"):
+                engine_args.update(
+                    pool_size=int(os.getenv("DB_POOL_SIZE", DEFAULT_POOL_SIZE)),
+                    max_overflow=int(os.getenv("DB_MAX_OVERFLOW", DEFAULT_MAX_OVERFLOW)),
+                    pool_recycle=int(os.getenv("DB_POOL_RECYCLE", DEFAULT_POOL_RECYCLE)),
+                )
+            _engine = create_engine(db_url, **engine_args)
+            if _engine.dialect.name == "postgresql":
+                event.listen(_engine, "connect", _set_vector_search_params)
+        return _engine
+
+
+def get_async_engine() -> AsyncEngine:
+    """
+    The process-wide async engine (psycopg 3) for the same PostgreSQL DATABASE_URL, created on first use.
+    Uses the same pool settings as get_engine. Only needed by the async API.
+    """
+    global _async_engine
+    with _engine_lock:
+        if _async_engine is None:
+            load_dotenv()
+            url = make_url(os.getenv("DATABASE_URL"))
+            if url.get_backend_name() != "postgresql":
+                raise ValueError("The async engine needs a PostgreSQL DATABASE_URL")
+            _async_engine = create_async_engine(
+                url.set(drivername="postgresql+psycopg"), echo=False, pool_pre_ping=True,
+                pool_size=int(os.getenv("DB_POOL_SIZE", DEFAULT_POOL_SIZE)),
+                max_overflow=int(os.getenv("DB_MAX_OVERFLOW", DEFAULT_MAX_OVERFLOW)),
+                pool_recycle=int(os.getenv("DB_POOL_RECYCLE", DEFAULT_POOL_RECYCLE)),
+            )
+            event.listen(_async_engine.sync_engine, "connect", _set_vector_search_params)
+        return _async_engine
+
+
+def _set_vector_search_params(dbapi_connection, connection_record) -> None:
+    """ apply the HNSW search setting (VECTOR_EF_SEARCH) to every new pooled connection """
+    ef_search = int(os.getenv("VECTOR_EF_SEARCH", DEFAULT_EF_SEARCH))
+    autocommit = dbapi_connection.autocommit
+    dbapi_connection.autocommit = True  # outside a transaction so the pool's reset does not undo it
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"SET hnsw.ef_search = {ef_search}")
+    cursor.close()
+    dbapi_connection.autocommit = autocommit
+
+
+def ensure_schema() -> None:
+    """
+    Create missing tables once per process. Set DB_CREATE_SCHEMA=0 to leave the schema to Alembic.
+    """
+    global _schema_created
+    with _schema_lock:
+        if _schema_created:
+            return
+        if os.getenv("DB_CREATE_SCHEMA", "1") != "0":
+            SQLModel.metadata.create_all(get_engine())
+        # only once create_all succeeded, a failed attempt (database not up yet) is retried on the next call
+        _schema_created = True
+
+
+def _chunked(rows:Iterable, size:int):
+    """ yield lists of at most size items """
+    iterator = iter(rows)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def dispose_engine() -> None:
+    """ close all pooled connections, e.g. at shutdown """
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.dispose()
+            _engine = None
+
+
+async def adispose_engine() -> None:
+    """ close the async engine's pooled connections; call from the event loop that used them """
+    global _async_engine
+    with _engine_lock:
+        engine, _async_engine = _async_engine, None
+    if engine is not None:
+        await engine.dispose()
 
 
 class DBHandler:
+    """ Session scope over the shared pooled engine. Cheap to open and close per operation. """
     def __init__(self):
         load_dotenv()
         self.engine = None
         self.session = None
         self.db_url = os.getenv("DATABASE_URL")
 
-        # Resolve the path using pathlib
-
 
     def __enter__(self):
         self.create_engine()
@@ -30,17 +145,16 @@ class DBHandler:
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         if self.session:
+            if exc_type:
+                self.session.rollback()
             self.session.close()
 
-        if self.engine:
-            self.engine.dispose()
         if exc_type or exc_val or exc_tb:
             print(f"An error occurred: \n {exc_val} \n {exc_tb} \n {exc_type}")
-        print("Database connection closed.")
 
 
     def create_engine(self):
-        self.engine = create_engine(self.db_url, echo=False)
+        self.engine = get_engine()
 
     def create_session(self):
         if self.engine:
@@ -49,15 +163,15 @@ class DBHandler:
             raise ValueError("Engine not created. Call create_engine first.")
 
     def create_schema(self):
-        """Create the database schema (tables) if they don't exist."""
+        """Create the database schema (tables) if they don't exist, once per process."""
         if self.engine:
-            SQLModel.metadata.create_all(self.engine)
+            ensure_schema()
         else:
             raise ValueError("Engine not created. Call create_engine first.")
 
 
-    def add_new_document(self, structured_data)->None:
-        """Add a document to the RAG table."""
+    def add_new_document(self, structured_data, commit:bool=True)->Documents|None:
+        """Add a document to the RAG table. With commit=False the caller commits (batched writes)."""
         try:
             # Ensure structured_data is not None and has all the required fields
             if not structured_data:
@@ -94,16 +208,52 @@ class DBHandler:
                 return None
 
             self.session.add(new_doc)
-            self.session.commit()
-
-            print("Document saved successfully.")
-            return None
+            if commit:
+                self.session.commit()
+                print("Document saved successfully.")
+            return new_doc
 
         except Exception as e:
             print(f"Error occurred: {e}")
+            if not commit:
+                raise  # the session holds the caller's uncommitted batch, let the caller decide
             self.session.rollback()
             return None
 
+    def retrieve_manifest(self)->List[IngestionManifest]:
+        """Retrieve all ingestion manifest entries."""
+        return list(self.session.exec(select(IngestionManifest)).all())
+
+    def upsert_manifest_entry(self, file_name:str, file_hash:str, text_hash:str, doc_id:int|None)->None:
+        """
+        Record which document a file was ingested into. If the file was ingested before with
+        different bytes, the entry is repointed and the old document removed once nothing references it.
+        The caller commits.
+        """
+        entry = self.session.exec(
+            select(IngestionManifest).where(IngestionManifest.file_name == file_name)).first()
+        old_doc_id = None
+        if entry:
+            old_doc_id = entry.doc_id
+            entry.file_hash = file_hash
+            entry.text_hash = text_hash
+            entry.doc_id = doc_id
+            entry.processed_on = datetime.now()
+        else:
+            entry = IngestionManifest(file_name=file_name, file_hash=file_hash,
+                                      text_hash=text_hash, doc_id=doc_id)
+        self.session.add(entry)
+
+        if old_doc_id is not None and old_doc_id != doc_id:
+            self.session.flush()
+            still_referenced = self.session.exec(
+                select(IngestionManifest.manifest_id).where(IngestionManifest.doc_id == old_doc_id)).first()
+            if still_referenced is None:
+                old_doc = self.session.get(Documents, old_doc_id)
+                if old_doc:
+                    self.session.delete(old_doc)
+                    print(f"Removed outdated document {old_doc_id} for {file_name}")
+
     def inspect_columns(self, table_name:str)->list:
         """
         Inspect the columns of the table.
@@ -125,31 +275,6 @@ class DBHandler:
             raise ValueError("Engine not created. Call create_engine first.")
 
 
-    def retrieve_all_documents_from_db(self)->List|None:
-        """Retrieve all documents from the ragdoc table."""
-        if self.engine:
-            all_docs = self.session.exec(select(Documents.title,
-                                                Documents.content,
-                                                Documents.category)).all()
-            print(f"Documents retrieved from the database. number of documents: {len(all_docs)}")
-
-            all_docs_dict = [
-                {"title": doc[0], "content": doc[1], "category": doc[2]} for doc in all_docs
-            ]
-            print(f"Documents retrieved from the database. number of documents: {len(all_docs)}")
-            return all_docs_dict
-        return None
-
-    @staticmethod
-    def store_documents_in_file(documents:List[dict[str:str]])->None:
-        """Store documents in a file."""
-
-        db_path = Path() / "files" /"documents.json"
-
-        with open(db_path, "w", encoding='utf-8') as json_file:
-            json.dump(documents, json_file, ensure_ascii=False,indent = 4)
-        print("Documents stored in documents.json. number of documents: ", len(documents))
-
     @staticmethod
     def store_resume_to_file(resume:str, type_name:str)->None:
         """ Store the resume to a file. """
@@ -158,28 +283,11 @@ class DBHandler:
             f.write(resume)
         print(f"Stored resume to file")
 
-    def save_job_to_db(self,  job:DataJobDescription, match: Match, job_title:str,job_url:str)->None:
-        """save job to database"""
-
-        company_name = job.company_name
-        contact_person = job.contact_person
-        employment_type = job.employment_type
-        requirements = job.requirements
-        nice_to_haves = job.nice_to_haves
-        compensation = job.compensation
-        company_industry = job.company_industry
-        summary = job.summary
-        location = job.location
-        work_type = job.work_type
-
-
-
-        print(
-            f"Saving job to database: {job_title}, {job.company_name}")
-
-        new_job = Jobs(
+    @staticmethod
+    def _job_row(job:DataJobDescription, match:Match, job_title:str, job_url:str)->dict:
+        """column values for a Jobs row"""
+        return dict(
             company_name=job.company_name,
-            contact_person=job.contact_person,
             job_title=job_title,
             location=job.location,
             work_type=job.work_type,
@@ -194,15 +302,128 @@ class DBHandler:
             company_industry=job.company_industry,
             summary=job.summary,
             match=match.match,
-            job_url=job_url,
+            job_url=normalize_job_url(job_url),
         )
+
+    def save_job_to_db(self,  job:DataJobDescription, match: Match, job_title:str,job_url:str)->None:
+        """save job to database"""
+        print(
+            f"Saving job to database: {job_title}, {job.company_name}")
+
+        new_job = Jobs(**self._job_row(job, match, job_title, job_url))
         self.session.add(new_job)
         self.session.commit()
 
+    def _insert(self, model):
+        """dialect specific INSERT that supports ON CONFLICT"""
+        dialect = self.engine.dialect.name
+        if dialect == "postgresql":
+            return postgresql.insert(model)
+        if dialect == "sqlite":
+            return sqlite.insert(model)
+        raise ValueError(f"Bulk upserts are not supported for {dialect}")
+
+    def add_documents_bulk(self, documents:Iterable[PDFMetadata], chunk_size:int=BULK_CHUNK_SIZE,
+                           commit:bool=True)->dict[str, int]:
+        """
+        Insert documents with one multi-row INSERT ... ON CONFLICT per chunk.
+        Documents whose content hash already exists update that row instead.
+        Returns content_hash -> doc_id for every document written.
+        """
+        doc_ids = {}
+        valid = (doc for doc in documents if doc and all([doc.title, doc.content, doc.category, doc.size]))
+        for chunk in _chunked(valid, chunk_size):
+            rows = {}
+            for doc in chunk:
+                content_hash = hash_text(doc.content)
+                now = datetime.now()
+                rows[content_hash] = dict(title=doc.title, content=doc.content, category=doc.category,
+                                          size=doc.size, content_hash=content_hash, created_on=now, updated_on=now)
+            stmt = self._insert(Documents).values(list(rows.values()))
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[Documents.content_hash],
+                set_={"title": stmt.excluded.title, "category": stmt.excluded.category, "size": stmt.excluded.size,
+                      "updated_on": stmt.excluded.updated_on},
+            ).returning(Documents.doc_id, Documents.content_hash)
+            for doc_id, content_hash in self.session.execute(stmt):
+                doc_ids[content_hash] = doc_id
+            if commit:
+                self.session.commit()
+            print(f"Saved {len(rows)} documents to database")
+        return doc_ids
+
+    def iter_documents(self, since:datetime|None=None, batch_size:int=BULK_CHUNK_SIZE)->Iterator[Documents]:
+        """
+        Stream documents updated after `since` (all documents if None), oldest change first.
+        Rows are fetched batch_size at a time (server-side cursor on Postgres), so don't commit
+        on this session while iterating.
+        """
+        stmt = select(Documents).order_by(Documents.updated_on, Documents.doc_id)
+        if since is not None:
+            stmt = stmt.where(Documents.updated_on > since)
+        yield from self.session.exec(stmt.execution_options(yield_per=batch_size))
+
+    def document_ids(self)->set[int]:
+        """ids of all stored documents"""
+        return set(self.session.exec(select(Documents.doc_id)).all())
+
+    def get_watermark(self, name:str)->datetime|None:
+        """last processed updated_on for the named consumer, None if it never ran"""
+        entry = self.session.get(IndexWatermark, name)
+        return entry.watermark if entry else None
+
+    def set_watermark(self, name:str, watermark:datetime)->None:
+        """store and commit the watermark for the named consumer"""
+        entry = self.session.get(IndexWatermark, name) or IndexWatermark(name=name, watermark=watermark)
+        entry.watermark = watermark
+        self.session.add(entry)
+        self.session.commit()
+
+    def clear_watermark(self, name:str)->None:
+        """forget the watermark so the consumer starts from scratch"""
+        entry = self.session.get(IndexWatermark, name)
+        if entry:
+            self.session.delete(entry)
+            self.session.commit()
+
+    def save_jobs_bulk(self, jobs:Iterable[tuple[DataJobDescription, Match, str, str]],
+                       chunk_size:int=BULK_CHUNK_SIZE)->int:
+        """
+        Upsert (job, match, job_title, job_url) tuples on job_url, committing once per chunk.
+        Application status and applied date of existing rows are kept.
+        Returns the number of rows written.
+        """
+        written = 0
+        for chunk in _chunked(jobs, chunk_size):
+            rows = {normalize_job_url(job_url): dict(self._job_row(job, match, job_title, job_url), date=datetime.now())
+                    for job, match, job_title, job_url in chunk}
+            stmt = self._insert(Jobs).values(list(rows.values()))
+            updated_columns = [column for column in next(iter(rows.values())) if column not in ("job_url", "date")]
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[Jobs.job_url],
+                set_={column: stmt.excluded[column] for column in updated_columns},
+            )
+            self.session.execute(stmt)
+            self.session.commit()
+            written += len(rows)
+            print(f"Saved {len(rows)} jobs to database")
+        return written
+
     def job_exists(self, job_url:str)->bool:
-        """Check if a job exists."""
-        """Check if a job with the given URL already exists in the database."""
-        stmt = select(Jobs).where(Jobs.job_url == job_url)
-        result = self.session.execute(
-            stmt).first()  # or .one_or_none()
-        return result is not None
\ No newline at end of file
+        """Check if a job with the given URL (normalized) already exists in the database."""
+        stmt = select(Jobs.job_id).where(Jobs.job_url == normalize_job_url(job_url))
+        return self.session.exec(stmt).first() is not None
+
+    def existing_job_urls(self, urls:Iterable[str], chunk_size:int=BULK_CHUNK_SIZE)->set[str]:
+        """
+        Return the subset of urls that already have a Jobs row, using one indexed query per chunk.
+        """
+        existing = set()
+        for chunk in _chunked(urls, chunk_size):
+            by_normalized = {}
+            for url in chunk:
+                by_normalized.setdefault(normalize_job_url(url), []).append(url)
+            stmt = select(Jobs.job_url).where(Jobs.job_url.in_(list(by_normalized)))
+            for job_url in self.session.exec(stmt):
+                existing.update(by_normalized[job_url])
+        return existing
@@ -0,0 +1,137 @@
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator
+
+from dotenv import load_dotenv
+
+from app.db_handler import DBHandler
+
+WATERMARK_NAME = "documents_export"
+COMPACT_RATIO = 2  # rewrite the export once it holds this many lines per live document
+
+
+class DocumentExport:
+    """
+    Export of the Documents table as JSON Lines (files/documents.jsonl).
+    Each run appends only documents changed since the last export (watermark), plus a tombstone line
+    for every removed document; later lines for a doc_id supersede earlier ones.
+    A sidecar index (doc_id -> byte offset of the current line) is extended incrementally,
+    so reading never parses superseded lines and appending never rescans the file.
+    Settings: DOCUMENT_EXPORT_PATH.
+    """
+
+    def __init__(self, path: Path | None = None):
+        load_dotenv()
+        project_root = Path(__file__).parent.parent
+        self.path = path or Path(os.getenv("DOCUMENT_EXPORT_PATH", project_root / "files" / "documents.jsonl"))
+        self.index_path = self.path.with_name(self.path.name + ".index")
+        self.legacy_path = self.path.with_suffix(".json")
+
+    def _read_index(self) -> dict:
+        """ stored index, extended with any lines appended since it was written """
+        try:
+            with open(self.index_path, "r") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = None
+        size = self.path.stat().st_size if self.path.exists() else 0
+        if index is None or index["size"] > size:
+            index = {"size": 0, "lines": 0, "offsets": {}}
+        if index["size"] < size:
+            with open(self.path, "rb") as f:
+                f.seek(index["size"])
+                offset = index["size"]
+                for line in f:
+                    record = json.loads(line)
+                    if record.get("deleted"):
+                        index["offsets"].pop(str(record["doc_id"]), None)
+                    else:
+                        index["offsets"][str(record["doc_id"])] = offset
+                    index["lines"] += 1
+                    offset += len(line)
+            index["size"] = offset
+            self._write_index(index)
+        return index
+
+    def _write_index(self, index: dict) -> None:
+        tmp_path = self.index_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self.index_path)
+
+    @staticmethod
+    def _line(record: dict) -> bytes:
+        return (json.dumps(record, ensure_ascii=False) + "\n").encode("utf8")
+
+    def export(self, full: bool = False) -> int:
+        """
+        Append new / changed documents (streamed from the database) and tombstones for removed ones.
+        full=True, a missing file or too many superseded lines rewrite the export from scratch.
+        Returns the number of documents written.
+        """
+        index = self._read_index() if self.path.exists() else None
+        if index and index["lines"] > COMPACT_RATIO * max(len(index["offsets"]), 1):
+            print("Compacting document export")
+            full = True
+        if full or index is None:
+            index = {"size": 0, "lines": 0, "offsets": {}}
+            since = None
+            mode = "wb"
+        else:
+            with DBHandler() as db:
+                since = db.get_watermark(WATERMARK_NAME)
+            mode = "ab"
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        written = 0
+        newest: datetime | None = None
+        with open(self.path, mode) as f, DBHandler() as reader:
+            offset = f.tell()
+            for document in reader.iter_documents(since=since):
+                line = self._line({"doc_id": document.doc_id, "title": document.title,
+                                   "content": document.content, "category": document.category,
+                                   "updated_on": document.updated_on.isoformat()})
+                f.write(line)
+                index["offsets"][str(document.doc_id)] = offset
+                offset += len(line)
+                newest = document.updated_on
+                written += 1
+            live_ids = {str(doc_id) for doc_id in reader.document_ids()}
+            removed = [doc_id for doc_id in index["offsets"] if doc_id not in live_ids]
+            for doc_id in removed:
+                line = self._line({"doc_id": int(doc_id), "deleted": True})
+                f.write(line)
+                offset += len(line)
+                del index["offsets"][doc_id]
+            index["lines"] += written + len(removed)
+            index["size"] = offset
+
+        self._write_index(index)
+        if newest is not None:
+            with DBHandler() as db:
+                db.set_watermark(WATERMARK_NAME, newest)
+        print(f"Exported {written} documents, removed {len(removed)} to {self.path}")
+        return written
+
+    def iter_documents(self) -> Iterator[dict]:
+        """
+        Lazily yield the current version of every exported document ({"doc_id", "title", "content", "category"}).
+        Falls back to the legacy documents.json snapshot when there is no export yet.
+        """
+        if not self.path.exists():
+            if self.legacy_path.exists():
+                with open(self.legacy_path, "r", encoding="utf-8") as f:
+                    yield from json.load(f)
+            return
+        offsets = sorted(self._read_index()["offsets"].values())
+        with open(self.path, "rb") as f:
+            for offset in offsets:
+                f.seek(offset)
+                record = json.loads(f.readline())
+                record.pop("updated_on", None)
+                yield record
+
+    def __iter__(self) -> Iterator[dict]:
+        return self.iter_documents()
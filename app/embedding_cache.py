@@ -0,0 +1,138 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import numpy.typing as npt
+from dotenv import load_dotenv
+
+DEFAULT_CAPACITY = 50_000
+
+
+class EmbeddingCache:
+    """
+    LRU cache of embeddings keyed by (model name, text hash).
+    Vectors live in a memory-mapped float32 matrix (one file per model), the key -> row index
+    in a SQLite file next to it. When the matrix is full the least recently used row is overwritten.
+    Lookups and inserts run in immediate SQLite transactions, so processes sharing the cache
+    (scraper, ingestion, a long-running service) never hand out the same row twice or read a row
+    while another process overwrites it.
+    Settings: EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_CAPACITY (rows).
+    """
+
+    def __init__(self, model_name: str, dimension: int | None = None, capacity: int | None = None,
+                 directory: Path | None = None):
+        load_dotenv()
+        project_root = Path(__file__).parent.parent
+        directory = directory or Path(os.getenv("EMBEDDING_CACHE_DIR", project_root / ".cache" / "embeddings"))
+        directory.mkdir(parents=True, exist_ok=True)
+        file_stem = re.sub(r"[^A-Za-z0-9_.-]", "_", model_name)
+        self.model_name = model_name
+        self.matrix_path = directory / f"{file_stem}.f32"
+        self.index_path = directory / f"{file_stem}.sqlite"
+        self.capacity = capacity or int(os.getenv("EMBEDDING_CACHE_CAPACITY", DEFAULT_CAPACITY))
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.index_path, check_same_thread=False, isolation_level=None,
+                                           timeout=30)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS slots (
+                key TEXT PRIMARY KEY,
+                slot INTEGER NOT NULL UNIQUE,
+                last_access REAL NOT NULL
+            )""")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS ix_slots_last_access ON slots (last_access)")
+
+        with self._transaction() as connection:
+            settings = dict(connection.execute("SELECT name, value FROM settings").fetchall())
+            stored_dimension = int(settings["dimension"]) if "dimension" in settings else None
+            self.dimension = dimension or stored_dimension
+            if self.dimension is None:
+                raise ValueError("Embedding dimension unknown: pass it or create the cache from the model first")
+            reuse = (stored_dimension == self.dimension and settings.get("capacity") == str(self.capacity)
+                     and self.matrix_path.exists())
+            if not reuse:
+                # new cache, or dimension / capacity changed: every stored row is invalid
+                connection.execute("DELETE FROM slots")
+                connection.executemany("INSERT OR REPLACE INTO settings (name, value) VALUES (?, ?)",
+                                       [("dimension", str(self.dimension)), ("capacity", str(self.capacity))])
+            self._matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r+" if reuse else "w+",
+                                     shape=(self.capacity, self.dimension))
+
+    @contextmanager
+    def _transaction(self):
+        """ an immediate transaction: takes the database write lock, waiting for other processes """
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield self._connection
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            raise
+        self._connection.execute("COMMIT")
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf8")).hexdigest()
+
+    def get_many(self, texts: list[str]) -> list[npt.NDArray[np.float32] | None]:
+        """ cached vectors (copies) in input order, None for misses """
+        results = []
+        now = time.time()
+        with self._lock, self._transaction() as connection:
+            for text in texts:
+                key = self.key(text)
+                row = connection.execute("SELECT slot FROM slots WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    self.misses += 1
+                    results.append(None)
+                else:
+                    self.hits += 1
+                    connection.execute("UPDATE slots SET last_access = ? WHERE key = ?", (now, key))
+                    results.append(np.array(self._matrix[row[0]]))
+        return results
+
+    def put_many(self, texts: list[str], vectors: npt.NDArray[np.float32]) -> None:
+        """ store vectors, evicting the least recently used rows when full """
+        now = time.time()
+        with self._lock, self._transaction() as connection:
+            # slots are only ever reassigned, never freed, so the row count is the next free row
+            used = connection.execute("SELECT COUNT(*) FROM slots").fetchone()[0]
+            for text, vector in zip(texts, vectors):
+                key = self.key(text)
+                row = connection.execute("SELECT slot FROM slots WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    slot = row[0]
+                    connection.execute("UPDATE slots SET last_access = ? WHERE key = ?", (now, key))
+                else:
+                    if used < self.capacity:
+                        slot = used
+                        used += 1
+                    else:
+                        oldest, slot = connection.execute(
+                            "SELECT key, slot FROM slots ORDER BY last_access LIMIT 1").fetchone()
+                        connection.execute("DELETE FROM slots WHERE key = ?", (oldest,))
+                    connection.execute("INSERT INTO slots (key, slot, last_access) VALUES (?, ?, ?)",
+                                        (key, slot, now))
+                self._matrix[slot] = vector
+            # rows reach the file before the index that points at them is committed
+            self._matrix.flush()
+
+    def flush(self) -> None:
+        """ persist the matrix (the index is committed on every call) """
+        with self._lock:
+            self._matrix.flush()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        with self._lock:
+            entries = self._connection.execute("SELECT COUNT(*) FROM slots").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries,
+                "hit_rate": self.hits / total if total else 0.0}
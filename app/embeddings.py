@@ -0,0 +1,86 @@
+import os
+import threading
+
+import numpy as np
+import numpy.typing as npt
+from dotenv import load_dotenv
+from langchain.embeddings.base import Embeddings
+
+from app.embedding_cache import EmbeddingCache
+from app.instrumentation import tracer
+
+DEFAULT_BATCH_SIZE = 64
+
+
+class EmbeddingFunctionWrapper(Embeddings):
+    """
+    LangChain embeddings backed by a SentenceTransformer.
+    The model is loaded on the first embed call that misses the embedding cache, so constructing
+    the wrapper is free. Vectors are L2-normalized float32.
+    Settings: EMBEDDING_BATCH_SIZE, EMBEDDING_CACHE_ENABLED.
+    """
+
+    def __init__(self, model_name: str, batch_size: int | None = None):
+        load_dotenv()
+        self.model_name = model_name
+        self.batch_size = batch_size or int(os.getenv("EMBEDDING_BATCH_SIZE", DEFAULT_BATCH_SIZE))
+        self.use_cache = os.getenv("EMBEDDING_CACHE_ENABLED", "1") != "0"
+        self._model = None
+        self._cache = None
+        self._lock = threading.RLock()  # reentrant: the cache may load the model while holding it
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    # imported here: torch + sentence_transformers take seconds to import
+                    from sentence_transformers import SentenceTransformer
+                    print(f"Loading embedding model {self.model_name}")
+                    self._model = SentenceTransformer(self.model_name)
+        return self._model
+
+    @property
+    def cache(self) -> EmbeddingCache | None:
+        if self._cache is None and self.use_cache:
+            with self._lock:
+                if self._cache is None:
+                    try:
+                        # an existing cache knows its dimension, no need to load the model
+                        self._cache = EmbeddingCache(self.model_name)
+                    except ValueError:
+                        self._cache = EmbeddingCache(self.model_name,
+                                                     dimension=self.model.get_sentence_embedding_dimension())
+        return self._cache
+
+    def _encode_uncached(self, texts: list[str]) -> npt.NDArray[np.float32]:
+        model = self.model  # loading the model is not part of the encode timing
+        with tracer.span("embedding.encode", texts=len(texts)):
+            vectors = model.encode(texts, batch_size=self.batch_size, convert_to_tensor=False,
+                                   normalize_embeddings=True)
+        return np.asarray(vectors, dtype=np.float32)
+
+    def encode(self, texts: list[str]) -> npt.NDArray[np.float32]:
+        """ embed texts as a (len(texts), dimension) float32 matrix, reusing cached vectors """
+        texts = list(texts)
+        cache = self.cache
+        if cache is None:
+            return self._encode_uncached(texts)
+
+        cached = cache.get_many(texts)
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, cached) if vector is None))
+        computed = {}
+        if missing:
+            vectors = self._encode_uncached(missing)
+            cache.put_many(missing, vectors)
+            computed = dict(zip(missing, vectors))
+        result = np.empty((len(texts), cache.dimension), dtype=np.float32)
+        for row, (text, vector) in enumerate(zip(texts, cached)):
+            result[row] = vector if vector is not None else computed[text]
+        return result
+
+    def embed_documents(self, texts: list[str]) -> npt.NDArray[np.float32]:
+        return self.encode(texts)
+
+    def embed_query(self, text: str) -> npt.NDArray[np.float32]:
+        return self.encode([text])[0]
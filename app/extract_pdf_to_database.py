@@ -1,15 +1,23 @@
 import os
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pydantic import BaseModel
-from dotenv import load_dotenv
 from app.db_handler import DBHandler
+from app.llm_cache import llm_cache
+from app.instrumentation import tracer
+from app.registry import get_chat_model
+from app.hashing import hash_file, hash_text
+from app.pdf_extraction import PDFTextExtractor
+from app.pdf_precleaner import PreCleaner, word_count
+from app.context_builder import ContextBuilder
+from app.document_export import DocumentExport
+from app.vector_indexer import VectorIndexer, CHUNK_SIZE, CHUNK_OVERLAP
 from pathlib import Path
-import pymupdf
 
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import SystemMessage
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
-from app.langchain_handler import LangChainHandler
 
 from typing import List
 from langchain_core.documents import Document
@@ -17,6 +25,17 @@ from langchain_core.documents import Document
 from db.schemas import PDFMetadata
 
 
+DEFAULT_LLM_CONCURRENCY = 4
+DB_BATCH_SIZE = 20
+
+
+class IngestionItem(BaseModel):
+    """ one file moving through the ingestion pipeline """
+    file_name: str
+    file_hash: str
+    text_hash: str = ""
+    structured_data: PDFMetadata | None = None
+    doc_id: int | None = None
 
 
 class CreateRAGData:
@@ -28,6 +47,13 @@ class CreateRAGData:
         self.text = None
         self.metadata = None
         self.files = self.list_pdf_files_in_dir()
+        self.stage_stats = {}
+        self.known_text_hashes = {}
+        self.seen_text_hashes = set()
+        self.pending_links = []
+        self.extractor = PDFTextExtractor()
+        self.precleaner = PreCleaner()
+        self.context_builder = ContextBuilder()
 
 
         self.llm = self.create_model()
@@ -38,11 +64,9 @@ class CreateRAGData:
         """create llm model"""
         print("Creating LLM model")
         model = "gpt-4o-mini"
-        load_dotenv()
-        api_key = os.environ.get("OPENAI_API_KEY")
-        llm = ChatOpenAI(model=model,
-                         temperature=0,
-                         max_tokens=1000, )
+        llm = get_chat_model(model=model,
+                             temperature=0,
+                             max_tokens=1000, )
         return llm
 
 
@@ -61,29 +85,27 @@ class CreateRAGData:
         """
         Extract text from a PDF file.
         """
-
-        """
-                Extract text from a PDF file.
-                """
-
         print(f"Extracting text from {file_name}")
-        extracted_text = ""
-        doc = pymupdf.open(
-            os.path.join(self.to_process_path, file_name))
-
-        for page in doc:
-            text = page.get_text().encode("utf8")
-            extracted_text += text.decode("utf8")
+        extracted_text = self.extractor.extract(os.path.join(self.to_process_path, file_name))
         print(f"Extracted text from {file_name}")
         return extracted_text
 
 
-    def clean_and_create_metadata(self,text)->PDFMetadata:
+    def _preclean(self, text:str, file_name:str)->tuple[PDFMetadata | None, List[SystemMessage]]:
         """
-        Tokenize the text into smaller chunks.
+        Metadata from the template rules, or the (normalized, budget-trimmed) cleaning prompt for the LLM.
         """
-        print("Cleaning Text")
-        prompt ="""
+        with tracer.span("preclean"):
+            normalized, metadata = self.precleaner.clean(file_name, text)
+        if metadata is not None:
+            return metadata, []
+        trimmed = self.context_builder.truncate(normalized, self.context_builder.budgets["cleaning_input"])
+        return None, self._cleaning_messages(trimmed)
+
+    @staticmethod
+    def _cleaning_messages(text:str)->List[SystemMessage]:
+        """ build the prompt for the cleaning / metadata call """
+        prompt =f"""
         Clean up the text and remove any unwanted characters.
         Correct the text to make it more readable. All the certificates and information have all been completed by
         Dean Didion. Correct any incorrectly assigned certificates to the correct person.
@@ -95,23 +117,45 @@ class CreateRAGData:
         size: The size of the document in word count
         Return the cleaned text as a string
         text to clean: {text}"""
+        return [SystemMessage(content=prompt)]
 
-        structured_llm = self.llm.with_structured_output(PDFMetadata)
-        response = structured_llm.invoke([SystemMessage(content=prompt)])
-
-
+    @staticmethod
+    def _print_metadata(response:PDFMetadata)->None:
         print(f"Data parsed")
         print(f"Title: {response.title}")
         print(f"Category: {response.category}")
         print(f"Size: {response.size}")
         print(f"Content: {response.content[:20]}...")
+
+    def clean_and_create_metadata(self, text:str, file_name:str="")->PDFMetadata:
+        """
+        Clean the text and create its metadata: recognized certificate templates by rule,
+        everything else with the LLM. The size (word count) is always computed locally.
+        """
+        print("Cleaning Text")
+        response, messages = self._preclean(text, file_name)
+        if response is None:
+            response = llm_cache.invoke(self.llm, PDFMetadata, messages)
+            response.size = word_count(response.content)
+        self._print_metadata(response)
+        return response
+
+    async def aclean_and_create_metadata(self, text:str, file_name:str="")->PDFMetadata:
+        """
+        Async version of clean_and_create_metadata, used by the ingestion pipeline.
+        """
+        response, messages = self._preclean(text, file_name)
+        if response is None:
+            response = await llm_cache.ainvoke(self.llm, PDFMetadata, messages)
+            response.size = word_count(response.content)
+        self._print_metadata(response)
         return response
 
 
     @staticmethod
     def split_document(doc:str)->List[Document]:
         """ split the document into smaller chunks.  """
-        splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
+        splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
         chunks = splitter.create_documents([doc])
         return chunks
 
@@ -132,26 +176,179 @@ class CreateRAGData:
             db.add_new_document(structured_data)
             print(f"Saved {structured_data.title} to database")
 
-
-    def main(self)->None:
+    @staticmethod
+    def save_batch_to_db(batch:List[IngestionItem])->List[str]:
         """
-        Main function to process the PDF files.
+        Save a batch of documents (one bulk upsert) and their manifest entries in a single transaction.
+        Items without structured data are duplicates that only get linked to an existing document.
+        Returns the file names that were persisted; the others are left for the next run.
+        """
+        with DBHandler() as db:
+            doc_ids = db.add_documents_bulk(
+                (item.structured_data for item in batch if item.structured_data is not None),
+                chunk_size=len(batch), commit=False)
+            saved = []
+            for item in batch:
+                doc_id = item.doc_id
+                if item.structured_data is not None:
+                    doc_id = doc_ids.get(hash_text(item.structured_data.content))
+                    if doc_id is None:
+                        print(f"{item.file_name} has incomplete metadata, not saved")
+                        continue
+                db.upsert_manifest_entry(item.file_name, item.file_hash, item.text_hash, doc_id)
+                saved.append(item.file_name)
+            db.session.commit()
+            print(f"Saved batch of {len(saved)} / {len(batch)} documents to database")
+            return saved
+
+    def _record_stage(self, stage:str, started:float, items:int=1)->None:
+        """ record processed items for a pipeline stage """
+        ended = time.perf_counter()
+        stats = self.stage_stats.setdefault(stage, {"count": 0, "busy": 0.0, "first": started, "last": ended})
+        stats["count"] += items
+        stats["busy"] += ended - started
+        stats["first"] = min(stats["first"], started)
+        stats["last"] = max(stats["last"], ended)
+
+    def report_throughput(self)->None:
+        """ print items/sec per pipeline stage """
+        print("-" * 20)
+        print(f"{'stage':<12}{'items':>8}{'wall [s]':>12}{'busy [s]':>12}{'items/s':>10}")
+        for stage, stats in self.stage_stats.items():
+            wall = stats["last"] - stats["first"]
+            rate = stats["count"] / wall if wall > 0 else 0.0
+            print(f"{stage:<12}{stats['count']:>8}{wall:>12.2f}{stats['busy']:>12.2f}{rate:>10.2f}")
+        print("-" * 20)
+
+    async def _process_file(self, item:IngestionItem, pool:ProcessPoolExecutor, semaphore:asyncio.Semaphore,
+                            queue:asyncio.Queue)->None:
+        """ extraction + OCR of scanned pages (process pool) -> skip empty / dedup -> cleaning (bounded LLM concurrency) -> DB writer queue """
+        file = item.file_name
+        try:
+            with tracer.span("document", file=file):
+                started = time.perf_counter()
+                raw_text = await self.extractor.aextract(str(self.to_process_path / file), pool)
+                self._record_stage("extraction", started)
+                if not raw_text.strip():
+                    print(f"No text found in {file}, leaving it in {self.to_process_path}")
+                    return
+                print(f"Extracted text from {file}")
+
+                item.text_hash = hash_text(raw_text)
+                if item.text_hash in self.known_text_hashes:
+                    print(f"{file} has the same text as an ingested document, linking instead of cleaning")
+                    item.doc_id = self.known_text_hashes[item.text_hash]
+                    await queue.put(item)
+                    return
+                if item.text_hash in self.seen_text_hashes:
+                    print(f"{file} duplicates another file in this run, linking after the batch is saved")
+                    self.pending_links.append(item)
+                    return
+                self.seen_text_hashes.add(item.text_hash)
+
+                async with semaphore:
+                    started = time.perf_counter()
+                    item.structured_data = await self.aclean_and_create_metadata(raw_text, file)
+                    self._record_stage("cleaning", started)
+            await queue.put(item)
+        except Exception as e:
+            print(f"Error while processing {file}: {e}")
+
+    async def _db_writer(self, queue:asyncio.Queue)->None:
+        """ collect cleaned documents and write them to the database in batches """
+        batch = []
+        while True:
+            item = await queue.get()
+            if item is not None:
+                batch.append(item)
+            if batch and (item is None or len(batch) >= DB_BATCH_SIZE):
+                await asyncio.to_thread(self._flush_batch, batch)
+                batch = []
+            if item is None:
+                return
+
+    def _flush_batch(self, batch:List[IngestionItem])->None:
+        """ save a batch and move the files that were persisted to the processed directory """
+        started = time.perf_counter()
+        try:
+            with tracer.span("db.write", items=len(batch)):
+                saved = self.save_batch_to_db(batch)
+        except Exception as e:
+            print(f"Error while saving batch: {e}")
+            return
+        self._record_stage("db_write", started, items=len(saved))
+        for file_name in saved:
+            self.move_file_to_processed(file_name)
+
+    def _partition_by_manifest(self)->tuple[List[IngestionItem], List[IngestionItem]]:
         """
+        Hash the files and split them into files that need processing and files whose bytes
+        were already ingested (unchanged, or a byte-identical copy under another name).
+        """
+        with DBHandler() as db:
+            manifest = db.retrieve_manifest()
+        known_files = {entry.file_hash: entry for entry in manifest}
+        self.known_text_hashes = {entry.text_hash: entry.doc_id for entry in manifest}
+
+        new_items, known_items = [], []
         for file in self.files:
-            print("-" * 20)
-            print(f"Processing {file}")
-            print("-"*20)
-            raw_text = self.extract_text_from_pdf(file)
-            cleaned_text = self.clean_and_create_metadata(raw_text)
-            self.save_to_db(structured_data=cleaned_text)
-            #print(f"Metadata: {cleaned_text.title}, {cleaned_text.category}, {cleaned_text.size}")
-            #split_docs = self.split_document(cleaned_text.content)
-            #lgh = LangChainHandler()
-            #lgh.add_to_vector_store_documents(split_docs)
-            self.move_file_to_processed(file)
-            print(f"Processed {file}")
-            print("-" * 20)
-            print("\n\n")
+            item = IngestionItem(file_name=file, file_hash=hash_file(self.to_process_path / file))
+            entry = known_files.get(item.file_hash)
+            if entry:
+                item.text_hash = entry.text_hash
+                item.doc_id = entry.doc_id
+                known_items.append(item)
+            else:
+                new_items.append(item)
+        print(f"{len(known_items)} files unchanged or duplicate, {len(new_items)} files to process")
+        return new_items, known_items
+
+    def _resolve_pending_links(self)->None:
+        """ link in-run duplicates to the document created for the first copy """
+        if not self.pending_links:
+            return
         with DBHandler() as db:
-            docs = db.retrieve_all_documents_from_db()
-            db.store_documents_in_file(docs)
+            doc_ids = {entry.text_hash: entry.doc_id for entry in db.retrieve_manifest()}
+        resolved = []
+        for item in self.pending_links:
+            if item.text_hash in doc_ids:
+                item.doc_id = doc_ids[item.text_hash]
+                resolved.append(item)
+            else:
+                print(f"Original of {item.file_name} was not saved, leaving it in {self.to_process_path}")
+        if resolved:
+            self._flush_batch(resolved)
+
+    async def run_pipeline(self, workers:int|None, llm_concurrency:int)->None:
+        """
+        Run the staged ingestion pipeline over all files in to_process.
+        Files already recorded in the ingestion manifest never reach extraction or the LLM.
+        """
+        new_items, known_items = self._partition_by_manifest()
+        semaphore = asyncio.Semaphore(llm_concurrency)
+        queue = asyncio.Queue()
+        writer = asyncio.create_task(self._db_writer(queue))
+        for item in known_items:
+            await queue.put(item)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            await asyncio.gather(*(self._process_file(item, pool, semaphore, queue) for item in new_items))
+        await queue.put(None)
+        await writer
+        self._resolve_pending_links()
+
+    def main(self, workers:int|None=None, llm_concurrency:int=DEFAULT_LLM_CONCURRENCY,
+             rebuild_index:bool=False)->None:
+        """
+        Main function to process the PDF files and bring the vector index up to date.
+        workers: size of the extraction process pool (defaults to the number of CPUs)
+        llm_concurrency: maximum number of cleaning calls in flight
+        rebuild_index: re-embed and re-export all documents instead of only new / changed ones
+        """
+        if self.files:
+            print(f"Processing {len(self.files)} files with workers={workers or os.cpu_count()}, "
+                  f"llm_concurrency={llm_concurrency}")
+            asyncio.run(self.run_pipeline(workers, llm_concurrency))
+            self.report_throughput()
+            llm_cache.print_stats()
+        VectorIndexer().run(rebuild=rebuild_index)
+        DocumentExport().export(full=rebuild_index)
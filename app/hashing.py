@@ -0,0 +1,22 @@
+import hashlib
+import re
+from pathlib import Path
+
+
+def hash_file(path: Path) -> str:
+    """
+    Content hash of the raw file bytes.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_text(text: str) -> str:
+    """
+    Content hash of a text, insensitive to whitespace and case.
+    """
+    normalized = re.sub(r"\s+", " ", text).strip().casefold()
+    return hashlib.sha256(normalized.encode("utf8")).hexdigest()
@@ -0,0 +1,183 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict
+from uuid import UUID
+
+from dotenv import load_dotenv
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+# USD per 1M tokens (input, output); model names are matched by prefix, longest first
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+}
+
+
+def llm_cost(model: str | None, input_tokens: int, output_tokens: int) -> float:
+    for name in sorted(MODEL_PRICES, key=len, reverse=True):
+        if model and model.startswith(name):
+            input_price, output_price = MODEL_PRICES[name]
+            return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+    return 0.0
+
+
+class Span:
+    """ one timed operation; LLM tokens and cost of everything inside it are added up """
+
+    def __init__(self, name: str, parent: "Span | None", attrs: Dict[str, Any]):
+        self.name = name
+        self.parent = parent
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cost = 0.0
+
+
+class Tracer:
+    """
+    Spans around pipeline stages, aggregated per span name for a summary table and written as
+    JSON lines (one per finished span) to TRACE_LOG_PATH. LLM calls are recorded through
+    LLMUsageCallback with the token counts reported by the API.
+    Settings: TRACE_ENABLED, TRACE_LOG_PATH.
+    """
+
+    def __init__(self, path: Path | None = None):
+        load_dotenv()
+        project_root = Path(__file__).parent.parent
+        self.path = path or Path(os.getenv("TRACE_LOG_PATH", project_root / ".cache" / "trace.jsonl"))
+        self.enabled = os.getenv("TRACE_ENABLED", "1") != "0"
+        self.stats: Dict[str, dict] = {}
+        self._current: contextvars.ContextVar[Span | None] = contextvars.ContextVar("current_span", default=None)
+        self._lock = threading.Lock()
+        self._log = None
+
+    @property
+    def current(self) -> Span | None:
+        return self._current.get()
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        """ time the enclosed block as a child of the current span """
+        span = Span(name, self._current.get(), attrs)
+        token = self._current.set(span)
+        error = None
+        try:
+            yield span
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            self._current.reset(token)
+            self._finish(span, time.perf_counter() - span.start, error)
+
+    def record_llm(self, model: str | None, parent: Span | None, duration: float,
+                   input_tokens: int, output_tokens: int, error: str | None = None) -> None:
+        """ an LLM call that already happened: log it and credit its tokens / cost to the enclosing spans """
+        span = Span(f"llm {model}", parent, {"model": model})
+        span.input_tokens, span.output_tokens = input_tokens, output_tokens
+        span.cost = llm_cost(model, input_tokens, output_tokens)
+        with self._lock:
+            ancestor = parent
+            while ancestor is not None:
+                ancestor.input_tokens += input_tokens
+                ancestor.output_tokens += output_tokens
+                ancestor.cost += span.cost
+                ancestor = ancestor.parent
+        self._finish(span, duration, error)
+
+    def _finish(self, span: Span, duration: float, error: str | None) -> None:
+        with self._lock:
+            stats = self.stats.setdefault(span.name, {"count": 0, "seconds": 0.0, "max_seconds": 0.0,
+                                                      "input_tokens": 0, "output_tokens": 0, "cost": 0.0,
+                                                      "errors": 0})
+            stats["count"] += 1
+            stats["seconds"] += duration
+            stats["max_seconds"] = max(stats["max_seconds"], duration)
+            stats["input_tokens"] += span.input_tokens
+            stats["output_tokens"] += span.output_tokens
+            stats["cost"] += span.cost
+            stats["errors"] += error is not None
+            if self.enabled:
+                self._write({"ts": datetime.now().isoformat(), "span": span.name,
+                             "parent": span.parent.name if span.parent else None,
+                             "duration_s": round(duration, 6), "input_tokens": span.input_tokens,
+                             "output_tokens": span.output_tokens, "cost_usd": round(span.cost, 6),
+                             "error": error, **span.attrs})
+
+    def _write(self, record: dict) -> None:
+        """ append one JSON line (caller holds the lock) """
+        if self._log is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._log = open(self.path, "a", encoding="utf-8", buffering=1)
+        self._log.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+    def print_summary(self) -> None:
+        """ wall-clock time, tokens and cost per span name, slowest first """
+        with self._lock:
+            rows = sorted(self.stats.items(), key=lambda item: item[1]["seconds"], reverse=True)
+        if not rows:
+            return
+        print("-" * 116)
+        print(f"{'span':<28}{'count':>7}{'total [s]':>11}{'mean [s]':>10}{'max [s]':>10}"
+              f"{'in tok':>10}{'out tok':>10}{'cost [$]':>11}{'$/count':>11}{'errors':>8}")
+        for name, stats in rows:
+            print(f"{name[:27]:<28}{stats['count']:>7}{stats['seconds']:>11.2f}"
+                  f"{stats['seconds'] / stats['count']:>10.3f}{stats['max_seconds']:>10.3f}"
+                  f"{stats['input_tokens']:>10}{stats['output_tokens']:>10}{stats['cost']:>11.4f}"
+                  f"{stats['cost'] / stats['count']:>11.5f}{stats['errors']:>8}")
+        llm_rows = [stats for name, stats in rows if name.startswith("llm ")]
+        if llm_rows:
+            print(f"LLM total: {sum(stats['count'] for stats in llm_rows)} calls, "
+                  f"{sum(stats['input_tokens'] for stats in llm_rows)} input / "
+                  f"{sum(stats['output_tokens'] for stats in llm_rows)} output tokens, "
+                  f"${sum(stats['cost'] for stats in llm_rows):.4f} (span rows include the calls nested in them)")
+        print("-" * 116)
+        if self.enabled:
+            print(f"Trace written to {self.path}")
+
+
+class LLMUsageCallback(BaseCallbackHandler):
+    """ records every chat model call with the token usage from its response """
+    run_inline = True  # run in the caller's context, so the enclosing span is known
+
+    def __init__(self, tracer: Tracer):
+        self.tracer = tracer
+        self._runs: Dict[UUID, tuple] = {}
+
+    def on_chat_model_start(self, serialized: dict, messages: list, *, run_id: UUID, **kwargs: Any) -> None:
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model") or params.get("model_name")
+        self._runs[run_id] = (time.perf_counter(), self.tracer.current, model)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        started, parent, model = self._runs.pop(run_id, (time.perf_counter(), self.tracer.current, None))
+        input_tokens = output_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                input_tokens += usage.get("input_tokens", 0)
+                output_tokens += usage.get("output_tokens", 0)
+        if not input_tokens and response.llm_output:
+            usage = response.llm_output.get("token_usage") or {}
+            input_tokens, output_tokens = usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+        model = (response.llm_output or {}).get("model_name") or model
+        self.tracer.record_llm(model, parent, time.perf_counter() - started, input_tokens, output_tokens)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        started, parent, model = self._runs.pop(run_id, (time.perf_counter(), self.tracer.current, None))
+        self.tracer.record_llm(model, parent, time.perf_counter() - started, 0, 0, error=type(error).__name__)
+
+
+tracer = Tracer()
+llm_usage_callback = LLMUsageCallback(tracer)
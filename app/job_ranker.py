@@ -0,0 +1,92 @@
+import os
+import re
+from typing import Iterable, List
+
+import numpy as np
+import numpy.typing as npt
+from dotenv import load_dotenv
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from app.registry import get_embeddings
+from app.vector_indexer import CHUNK_SIZE, CHUNK_OVERLAP
+
+DEFAULT_ALPHA = 0.7  # weight of the embedding score, the rest goes to BM25
+TOP_CHUNKS = 3
+BM25_K1 = 1.5
+BM25_B = 0.75
+STOPWORDS = {
+    "and", "the", "for", "with", "you", "your", "our", "are", "will", "who", "from", "this", "that",
+    "have", "has", "not", "all", "can", "their", "they", "into", "about", "more", "such",
+    "und", "der", "die", "das", "mit", "für", "von", "wir", "sie", "ein", "eine", "den", "dem", "des",
+    "ist", "sind", "auf", "bei", "oder", "als", "auch", "zu", "im", "in",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in re.findall(r"\w+", text.casefold())
+            if len(token) > 2 and token not in STOPWORDS and not token.isdigit()]
+
+
+class JobRanker:
+    """
+    Local pre-screen for job postings, run before any LLM call.
+    The profile summary and the chunks of all documents are embedded once; a page of postings is then
+    scored in one pass as a hybrid of embedding similarity (profile and best-matching chunks) and BM25
+    of the profile's terms within the page. Only the top-k / above-cutoff postings go on to the LLM.
+    Settings: JOB_RANK_ALPHA (weight of the embedding score).
+    """
+
+    def __init__(self, profile_summary: str, documents: Iterable[dict], alpha: float | None = None):
+        load_dotenv()
+        self.alpha = alpha if alpha is not None else float(os.getenv("JOB_RANK_ALPHA", DEFAULT_ALPHA))
+        splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+        chunks = [chunk for document in documents for chunk in splitter.split_text(document.get("content") or "")]
+        vectors = get_embeddings().encode([profile_summary or ""] + chunks)
+        self.profile_vector = vectors[0]
+        self.chunk_matrix = vectors[1:]
+        self.query_terms = {term: column for column, term in enumerate(sorted(set(tokenize(profile_summary or ""))))}
+        print(f"Job ranker ready: profile + {len(chunks)} chunks, {len(self.query_terms)} profile terms")
+
+    def _dense_scores(self, postings: npt.NDArray[np.float32]) -> npt.NDArray[np.float32]:
+        """ mean of the profile similarity and the average similarity of the best matching chunks """
+        profile_scores = postings @ self.profile_vector
+        if len(self.chunk_matrix) == 0:
+            return profile_scores
+        chunk_scores = postings @ self.chunk_matrix.T
+        top = min(TOP_CHUNKS, chunk_scores.shape[1])
+        best_chunks = np.partition(chunk_scores, -top, axis=1)[:, -top:].mean(axis=1)
+        return (profile_scores + best_chunks) / 2
+
+    def _bm25_scores(self, texts: List[str]) -> npt.NDArray[np.float64]:
+        """ BM25 of the profile terms against each posting, idf taken over the page, scaled to [0, 1] """
+        counts = np.zeros((len(texts), max(len(self.query_terms), 1)))
+        lengths = np.zeros(len(texts))
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            lengths[row] = len(tokens)
+            for token in tokens:
+                column = self.query_terms.get(token)
+                if column is not None:
+                    counts[row, column] += 1
+        document_frequency = (counts > 0).sum(axis=0)
+        idf = np.log(1 + (len(texts) - document_frequency + 0.5) / (document_frequency + 0.5))
+        average_length = lengths.mean() or 1.0
+        tf = counts * (BM25_K1 + 1) / (counts + BM25_K1 * (1 - BM25_B + BM25_B * lengths[:, None] / average_length))
+        scores = tf @ idf
+        return scores / scores.max() if scores.max() > 0 else scores
+
+    def score(self, texts: List[str]) -> npt.NDArray[np.float64]:
+        """ hybrid score per posting, higher is more relevant """
+        if not texts:
+            return np.zeros(0)
+        dense = self._dense_scores(get_embeddings().encode(texts))
+        return self.alpha * dense + (1 - self.alpha) * self._bm25_scores(texts)
+
+    def select(self, texts: List[str], top_k: int | None = None, min_score: float | None = None
+               ) -> List[tuple[int, float]]:
+        """ (index, score) of the postings worth an LLM call, best first """
+        scores = self.score(texts)
+        ranked = [(int(index), float(scores[index])) for index in np.argsort(-scores)]
+        if min_score is not None:
+            ranked = [(index, score) for index, score in ranked if score >= min_score]
+        return ranked[:top_k] if top_k is not None else ranked
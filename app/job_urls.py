@@ -0,0 +1,19 @@
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# query parameters LinkedIn adds per search / click, they do not identify the posting
+TRACKING_PARAMS = {"refId", "trackingId", "position", "pageNum", "trk", "trkInfo", "lipi",
+                   "originalSubdomain", "eBP", "midToken", "midSig", "currentJobId"}
+
+
+def normalize_job_url(url: str) -> str:
+    """
+    Canonical form of a job posting URL: https, lower-case host, the bare LinkedIn host and its
+    locale subdomains mapped to www, tracking parameters / fragment / trailing slash removed.
+    """
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host == "linkedin.com" or host.endswith(".linkedin.com"):
+        host = "www.linkedin.com"
+    query = urlencode([(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                       if key not in TRACKING_PARAMS and not key.startswith("utm_")])
+    return urlunsplit(("https", host, parts.path.rstrip("/"), query, ""))
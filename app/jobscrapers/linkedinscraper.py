@@ -1,5 +1,11 @@
 
+import argparse
+import asyncio
+import re
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
@@ -9,14 +15,60 @@ from selenium.common.exceptions import TimeoutException
 from bs4 import BeautifulSoup
 from app.langchain_handler import LangChainHandler
 from app.db_handler import DBHandler
+from app.llm_cache import llm_cache
+from app.async_utils import with_backoff
+from app.job_urls import normalize_job_url
+from app.document_export import DocumentExport
+from app.job_ranker import JobRanker
+from app.instrumentation import tracer
 
 
+MATCH_THRESHOLD = 75
+DEFAULT_LLM_CONCURRENCY = 5
+HTTP_POOL_SIZE = 8
+HEADERS = {"User-Agent": "Mozilla/5.0"}  # Important to avoid 403
+
+
+def parse_job_description(html:str)->str|None:
+    """ extract the job description text from a job detail page (static or rendered) """
+    soup = BeautifulSoup(html, 'html.parser')
+    description = soup.find(class_='description__text')
+    if description is None:
+        return None
+    for button in description.find_all('button'):
+        button.decompose()  # "show more" / "show less" toggles
+    for tag in description.find_all(['br', 'p', 'li', 'ul', 'ol']):
+        tag.insert_before("\n")
+        tag.insert_after("\n")
+    lines = (re.sub(r"\s+", " ", line).strip() for line in description.get_text(" ").splitlines())
+    text = "\n".join(line for line in lines if line)
+    return text or None
 
 
 class LinkedinScraper:
 
-    def __init__(self):
+    def __init__(self, top_k:int|None=None, min_score:float|None=None):
+        """
+        top_k / min_score: rank every page of postings locally (JobRanker) and only send the
+        top_k / those scoring at least min_score to the LLM. Without either all postings are matched.
+        """
         self.jobs = []
+        self.session = self._create_session()
+        self.driver = None
+        self.top_k = top_k
+        self.min_score = min_score
+        self.ranker = None
+
+    @staticmethod
+    def _create_session()->requests.Session:
+        """ keep-alive session with a connection pool sized for concurrent page fetches """
+        session = requests.Session()
+        session.headers.update(HEADERS)
+        retries = Retry(total=2, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=HTTP_POOL_SIZE, max_retries=retries)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
 
     def scrape_job_links(self):
 
@@ -26,90 +78,268 @@ class LinkedinScraper:
         WORK_TYPE = 2  # 1 = Onsite, 2=Remote, 3=hybrid
         LOCATION = "Germany"
         url = f"https://www.linkedin.com/jobs/search/?keywords={SEARCH}&location={LOCATION}&f_WT={WORK_TYPE}"
-        headers = {
-                "User-Agent": "Mozilla/5.0"}  # Important to avoid 403
 
-        response = requests.get(url, headers=headers)
+        response = self.session.get(url, timeout=30)
         soup = BeautifulSoup(response.text, 'html.parser')
 
 
+        seen = {job_url for _, job_url in self.jobs}
         for link in soup.find_all('a', class_='base-card__full-link'):
             job_title = link.get_text(strip=True)
-            job_url = link['href']
-            self.jobs.append((job_title, job_url))
+            job_url = normalize_job_url(link['href'])
+            if job_url not in seen:
+                seen.add(job_url)
+                self.jobs.append((job_title, job_url))
 
-    from selenium.common.exceptions import TimeoutException
-
-    def get_job_info(self):
-        print("-" * 50)
-        print(
-            f"Getting job info... for {len(self.jobs)} jobs")
-        MATCH_THRESHOLD = 75
+    @staticmethod
+    def _create_driver():
+        """ headless chrome for the job detail pages """
         options = Options()
         options.headless = True
         driver = webdriver.Chrome(options=options)
         driver.set_page_load_timeout(60)  # add timeout
+        return driver
+
+    def _get_driver(self):
+        """ start headless chrome only once a page actually needs it """
+        if self.driver is None:
+            print("Starting headless Chrome for pages that need rendering")
+            self.driver = self._create_driver()
+        return self.driver
+
+    def close(self)->None:
+        """ release the browser and the HTTP connection pool """
+        if self.driver is not None:
+            self.driver.quit()
+            self.driver = None
+        self.session.close()
+
+    def fetch_description_http(self, job_title:str, job_url:str)->str|None:
+        """ fast path: fetch the public job page over the pooled session """
         try:
-            for idx, job in enumerate(self.jobs, start=1):
-                job_title, job_url = job
-                with DBHandler() as db:
-                    if db.job_exists(job_url):
-                        print(f"Job {idx} already exists, skipping")
-                        continue
+            with tracer.span("page.fetch", method="http"):
+                response = self.session.get(job_url, timeout=15)
+        except requests.RequestException as e:
+            print(f"HTTP fetch failed for {job_title}: {e}")
+            return None
+        if response.status_code != 200:
+            print(f"HTTP fetch for {job_title} returned {response.status_code}")
+            return None
+        return parse_job_description(response.text)
 
-                print(
-                    f"Getting job info for {job_title} - job_nr: {idx} / {len(self.jobs)}")
+    def fetch_description_browser(self, job_title:str, job_url:str)->str|None:
+        """ slow path: load the job page in headless chrome, None if it could not be loaded """
+        with tracer.span("page.fetch", method="browser"):
+            return self._load_in_browser(job_url)
+
+    def _load_in_browser(self, job_url:str)->str|None:
+        driver = self._get_driver()
+        try:
+            driver.get(job_url)
+        except TimeoutException:
+            print(
+                f"Timeout loading page {job_url}, skipping job.")
+            return None
+
+        try:
+            WebDriverWait(driver,
+                          30).until(
+                ec.presence_of_element_located(
+                    (By.CLASS_NAME,
+                     'description__text')))
+        except TimeoutException:
+            print(
+                f"No job description found on {job_url}, skipping job.")
+            return None
+        return parse_job_description(driver.page_source)
+
+    def prefetch_descriptions_http(self, jobs:list)->dict[str, str]:
+        """ fetch many job pages concurrently over the pooled session, keyed by job url """
+        with ThreadPoolExecutor(max_workers=HTTP_POOL_SIZE) as pool:
+            texts = pool.map(lambda job: self.fetch_description_http(*job), jobs)
+            return {job_url: text for (_, job_url), text in zip(jobs, texts) if text}
+
+    def _new_jobs(self)->list:
+        """ the scraped jobs that are not in the database yet, checked in one query """
+        with DBHandler() as db:
+            known = db.existing_job_urls(job_url for _, job_url in self.jobs)
+        jobs = [job for job in self.jobs if job[1] not in known]
+        print(f"{len(self.jobs) - len(jobs)} jobs already exist, skipping")
+        return jobs
+
+    def _prepare_matching(self, lch:LangChainHandler)->None:
+        """ profile summary for the match prompt and, with ranking enabled, the job ranker """
+        lch.create_profile_summary()
+        if self.top_k is not None or self.min_score is not None:
+            self.ranker = JobRanker(lch.profile_summary, DocumentExport().iter_documents())
+
+    def rank_postings(self, postings:list)->list:
+        """ the (job_title, job_url, text) postings that pass the local ranking, best first """
+        if self.ranker is None or not postings:
+            return postings
+        with tracer.span("job.rank", postings=len(postings)):
+            selected = self.ranker.select([text for _, _, text in postings],
+                                          top_k=self.top_k, min_score=self.min_score)
+        for index, score in selected:
+            print(f"Ranked {postings[index][0]}: {score:.3f}")
+        print(f"{len(selected)} / {len(postings)} postings selected for matching")
+        return [postings[index] for index, _ in selected]
+
+    def get_job_info(self):
+        print("-" * 50)
+        print(
+            f"Getting job info... for {len(self.jobs)} jobs")
+        try:
+            jobs = self._new_jobs()
+            prefetched = self.prefetch_descriptions_http(jobs)
+            print(f"Fetched {len(prefetched)} / {len(jobs)} job descriptions over HTTP")
+            lch = LangChainHandler()
+            self._prepare_matching(lch)
+            postings = []
+            for job_title, job_url in jobs:
                 try:
-                    driver.get(job_url)
-                except TimeoutException:
-                    print(
-                        f"Timeout loading page {job_url}, skipping job.")
+                    clean_text = prefetched.get(job_url) or self.fetch_description_browser(job_title, job_url)
+                except Exception as e:
+                    print(f"Error while loading job page: {e}")
                     continue
+                if clean_text:
+                    postings.append((job_title, job_url, clean_text))
+            postings = self.rank_postings(postings)
 
+            for idx, (job_title, job_url, clean_text) in enumerate(postings, start=1):
+                print(
+                    f"Getting job info for {job_title} - job_nr: {idx} / {len(postings)}")
                 try:
-                    job_desc = WebDriverWait(driver,
-                                             30).until(
-                        ec.presence_of_element_located(
-                            (By.CLASS_NAME,
-                             'description__text')))
-                    clean_text = job_desc.text.strip()
+                    with tracer.span("job.match"):
+                        result = lch.match_and_extract(clean_text)
                     print(
-                        f"Retrieved raw job info for {job_title}")
+                        f"Initial match value: {result.match}")
+
+                    if result.match > MATCH_THRESHOLD:
+                        job_key_data, match = result.split()
+                        print(job_key_data)
 
-                    if clean_text:
-                        lch = LangChainHandler()
-                        match = lch.match_for_jobs(
-                            clean_text)
+                        with DBHandler() as dbh:
+                            dbh.save_job_to_db(
+                                job_key_data, match,
+                                job_title, job_url)
+                    else:
                         print(
-                            f"Initial match value: {match.match}")
-
-                        if match.match > MATCH_THRESHOLD:
-                            print(
-                                f"processing with data extraction: {match.match}")
-                            job_key_data = lch.extract_key_data_from_job_description(
-                                external_job_description=True)
-                            print(job_key_data)
-
-                            with DBHandler() as dbh:
-                                dbh.save_job_to_db(
-                                    job_key_data, match,
-                                    job_title, job_url)
-                        else:
-                            print(
-                                f"Skipping job - match = {match.match} (threshold = {MATCH_THRESHOLD})")
+                            f"Skipping job - match = {result.match} (threshold = {MATCH_THRESHOLD})")
                 except Exception as e:
                     print(
                         f"Error while processing job: {e}")
         finally:
-            driver.quit()
+            self.close()
+            llm_cache.print_stats()
+            print("-" * 50)
+
+    async def _fetch_page(self, job_title:str, job_url:str, queue:asyncio.Queue,
+                          http_semaphore:asyncio.Semaphore, browser_lock:asyncio.Lock)->None:
+        """ fetch one job page (HTTP first, browser one page at a time) and queue the description """
+        try:
+            async with http_semaphore:
+                clean_text = await asyncio.to_thread(self.fetch_description_http, job_title, job_url)
+            if clean_text is None:
+                async with browser_lock:
+                    clean_text = await asyncio.to_thread(self.fetch_description_browser, job_title, job_url)
+        except Exception as e:
+            print(f"Error while loading job page: {e}")
+            return
+        if clean_text:
+            print(
+                f"Retrieved raw job info for {job_title}")
+            await queue.put((job_title, job_url, clean_text))
+
+    async def _fetch_pages(self, jobs:list, queue:asyncio.Queue, consumers:int)->None:
+        """ producer: fetch job pages concurrently and queue the descriptions """
+        http_semaphore = asyncio.Semaphore(HTTP_POOL_SIZE)
+        browser_lock = asyncio.Lock()
+        try:
+            await asyncio.gather(*(self._fetch_page(job_title, job_url, queue, http_semaphore, browser_lock)
+                                   for job_title, job_url in jobs))
+        finally:
+            for _ in range(consumers):
+                await queue.put(None)
+
+    async def _fetch_and_rank(self, jobs:list, queue:asyncio.Queue, consumers:int)->None:
+        """ producer with ranking: fetch the whole page, then queue only the selected postings """
+        fetched = asyncio.Queue()
+        try:
+            await self._fetch_pages(jobs, fetched, 0)
+            postings = [fetched.get_nowait() for _ in range(fetched.qsize())]
+            for posting in await asyncio.to_thread(self.rank_postings, postings):
+                await queue.put(posting)
+        finally:
+            for _ in range(consumers):
+                await queue.put(None)
+
+    async def _match_jobs(self, lch:LangChainHandler, queue:asyncio.Queue, results:list)->None:
+        """ consumer: match and extract queued job descriptions, one call each """
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            job_title, job_url, clean_text = item
+            try:
+                with tracer.span("job.match"):
+                    result = await with_backoff(lambda: lch.amatch_and_extract(clean_text))
+                print(f"Initial match value for {job_title}: {result.match}")
+                if result.match <= MATCH_THRESHOLD:
+                    print(
+                        f"Skipping job - match = {result.match} (threshold = {MATCH_THRESHOLD})")
+                    continue
+                job_key_data, match = result.split()
+                results.append((job_key_data, match, job_title, job_url))
+            except Exception as e:
+                print(
+                    f"Error while processing job: {e}")
+
+    async def get_job_info_concurrent(self, llm_concurrency:int=DEFAULT_LLM_CONCURRENCY)->None:
+        """
+        Page loading feeds a queue while up to llm_concurrency match / extraction calls run at once.
+        """
+        print("-" * 50)
+        print(
+            f"Getting job info... for {len(self.jobs)} jobs (llm concurrency = {llm_concurrency})")
+        results = []
+        try:
+            jobs = self._new_jobs()
+            lch = LangChainHandler()
+            await asyncio.to_thread(self._prepare_matching, lch)
+            queue = asyncio.Queue(maxsize=llm_concurrency * 2)
+            producer = self._fetch_pages if self.ranker is None else self._fetch_and_rank
+            await asyncio.gather(
+                producer(jobs, queue, llm_concurrency),
+                *(self._match_jobs(lch, queue, results) for _ in range(llm_concurrency)))
+        finally:
+            await asyncio.to_thread(self.close)
+            if results:
+                with tracer.span("db.write", items=len(results)), DBHandler() as dbh:
+                    dbh.save_jobs_bulk(results)
+            llm_cache.print_stats()
             print("-" * 50)
 
 
-    def main(self):
+    def main(self, concurrent:bool=False, llm_concurrency:int=DEFAULT_LLM_CONCURRENCY):
         self.scrape_job_links()
-        self.get_job_info()
+        if concurrent:
+            asyncio.run(self.get_job_info_concurrent(llm_concurrency))
+        else:
+            self.get_job_info()
+        tracer.print_summary()
 
 
 if __name__ == '__main__':
-    linkedin_scraper = LinkedinScraper()
-    linkedin_scraper.main()
+    parser = argparse.ArgumentParser(description="Scrape LinkedIn jobs and match them against the profile")
+    parser.add_argument("--concurrent", action="store_true",
+                        help="run the match / extraction LLM calls concurrently")
+    parser.add_argument("--llm-concurrency", type=int, default=DEFAULT_LLM_CONCURRENCY,
+                        help="maximum number of LLM calls in flight in concurrent mode")
+    parser.add_argument("--top-k", type=int, default=None,
+                        help="rank postings locally and only match the best k with the LLM")
+    parser.add_argument("--min-score", type=float, default=None,
+                        help="rank postings locally and only match those scoring at least this (0..1)")
+    args = parser.parse_args()
+    linkedin_scraper = LinkedinScraper(top_k=args.top_k, min_score=args.min_score)
+    linkedin_scraper.main(concurrent=args.concurrent, llm_concurrency=args.llm_concurrency)
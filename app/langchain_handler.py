@@ -1,26 +1,31 @@
+import asyncio
 
-from langchain_openai import ChatOpenAI
 from dotenv import load_dotenv
-import json
 
 from langchain_postgres import PGVector
-from langchain.embeddings.base import Embeddings
-from sentence_transformers import SentenceTransformer
 
 from langchain_core.messages import (
     SystemMessage,
 )
 from pathlib import Path
 from app.db_handler import DBHandler
-import os
-
-from typing import List, Tuple
-import numpy.typing as npt
+from app.document_export import DocumentExport
+from app.profile_summary import ProfileSummary
+from app.context_builder import ContextBuilder
+from app.cover_letter_refiner import CoverLetterRefiner
+from app.llm_cache import llm_cache
+from app.instrumentation import tracer
+from app.local_vector_store import LocalVectorStore
+from app.registry import get_chat_model, get_vector_store, get_embeddings, COLLECTION_NAME
+from app.db_handler import get_engine, get_async_engine
+from app.vector_search import pgvector_batch_search, apgvector_batch_search
+
+from typing import Dict, List, Tuple
 import numpy as np
-from torch import Tensor
+import numpy.typing as npt
 from langchain.schema import Document
 
-from db.schemas import AIResponse, EvaluateCoverLetter, Match, DataJobDescription
+from db.schemas import AIResponse, EvaluateCoverLetter, Match, DataJobDescription, MatchedJobDescription
 
 
 
@@ -29,16 +34,18 @@ class LangChainHandler:
     def __init__(self):
 
         load_dotenv()
-        self.llm = ChatOpenAI(
+        self.llm = get_chat_model(
             model="gpt-4o-mini",
             temperature=0.7,
             max_retries = 3,
         )
+        # same model for the concurrent path, where with_backoff is the only retry layer
+        self.llm_without_retries = get_chat_model(model="gpt-4o-mini", temperature=0.7, max_retries=0)
 
 
+        self.context_builder = ContextBuilder()
         self.structured_job_description = None
-        self.vector_store = self._vector_store_documents()
-        self.documents = None
+        self.profile_summary = None
         self.job_description = None
 
     def extract_key_data_from_job_description(self, external_job_description=None):
@@ -48,8 +55,27 @@ class LangChainHandler:
             print("Using external job description")
 
         print("Extracting key data from job description")
-        prompt = f"""
-        Extract the key data from the job description {self.job_description} and return it in a structured format.
+        prompt = self._job_description_prompt(self.job_description)
+
+        # Generate response from LLM
+        self.structured_job_description:DataJobDescription = llm_cache.invoke(
+            self.llm, DataJobDescription, [SystemMessage(content=prompt)])
+        assert isinstance(self.structured_job_description, DataJobDescription), "Response is not of type AIResponse on Generation"
+        self._print_job_description(self.structured_job_description)
+        return self.structured_job_description
+
+    async def aextract_key_data_from_job_description(self, job_description:str) -> DataJobDescription:
+        """Async extraction for a given job description. Does not touch the handler state, so it is safe to run concurrently."""
+        structured_job_description = await llm_cache.ainvoke(
+            self.llm, DataJobDescription, [SystemMessage(content=self._job_description_prompt(job_description))])
+        self._print_job_description(structured_job_description)
+        return structured_job_description
+
+    @staticmethod
+    def _job_description_prompt(job_description:str) -> str:
+        """ prompt for the structured job description extraction """
+        return f"""
+        Extract the key data from the job description {job_description} and return it in a structured format.
         The key data should include the following fields:
         1. Company Name (name of the company offering the job)
         2. Contact Person (if available)    
@@ -70,36 +96,45 @@ class LangChainHandler:
         16. Summary (e.g. skills, experience, etc.)
         """
 
-        # Generate response from LLM
-        structured_llm = self.llm.with_structured_output(DataJobDescription)
-        self.structured_job_description:DataJobDescription = structured_llm.invoke([SystemMessage(content=prompt)])
-        assert isinstance(self.structured_job_description, DataJobDescription), "Response is not of type AIResponse on Generation"
+    @staticmethod
+    def _print_job_description(structured_job_description:DataJobDescription) -> None:
         print("Structured job description generated")
         print("-" * 20)
-        print(f"Company Name: {self.structured_job_description.company_name}")
-        print(f"Role: {self.structured_job_description.job_title}")
-        print(f"Requirements: {self.structured_job_description.requirements}")
-        print(f"Preferred/Nice to Have: {self.structured_job_description.nice_to_haves}")
-        print(f"Compensation: {self.structured_job_description.compensation}")
-        print(f"Location: {self.structured_job_description.location}")
-        print(f"Summary: {self.structured_job_description.summary}")
+        print(f"Company Name: {structured_job_description.company_name}")
+        print(f"Role: {structured_job_description.job_title}")
+        print(f"Requirements: {structured_job_description.requirements}")
+        print(f"Preferred/Nice to Have: {structured_job_description.nice_to_haves}")
+        print(f"Compensation: {structured_job_description.compensation}")
+        print(f"Location: {structured_job_description.location}")
+        print(f"Summary: {structured_job_description.summary}")
         print("-" * 20)
 
-        return self.structured_job_description
-
 
 
 
-    def create_cover_letter(self, requirements, nice_to_haves, experiences,) -> AIResponse:
-        """Generate a response using the validated query and supplementary documents."""
-        print("Creating draft cover letter")
-
-        # Extract user query and documents
+    def cover_letter_context(self, requirements, nice_to_haves, experiences,
+                             structured_job_description:DataJobDescription|None=None) -> Dict[str, str]:
+        """job description (default: the handler's) and retrieved chunks, packed into the prompt budgets"""
+        return self.context_builder.build({
+            "job_description": structured_job_description or self.structured_job_description,
+            "requirements": requirements,
+            "nice_to_haves": nice_to_haves,
+            "experiences": experiences,
+        })
 
-        prompt_with_docs = f"""
-        Job Description: {self.structured_job_description} Using the results from the similarity search and from
-        the matching requirements {requirements}, possible nice to haves {nice_to_haves}, and experience levels {experiences}, create a cover letter with the goal of
-        landing the job.
+    @staticmethod
+    def _cover_letter_prompt(context:Dict[str, str], feedback:str="") -> str:
+        """ prompt for a cover letter draft; feedback carries the previous draft and its weak points """
+        return f"""
+        Job Description:
+        {context["job_description"]}
+        Using the results from the similarity search and from the matching requirements
+        {context["requirements"]}
+        possible nice to haves
+        {context["nice_to_haves"]}
+        and experience levels
+        {context["experiences"]}
+        create a cover letter with the goal of landing the job.
         The cover letter should be no longer than one page and should be in a professional format.
         The cover letter should be structured as follows:
         1. cl_company (Company Name)
@@ -111,22 +146,35 @@ class LangChainHandler:
         7. cl_closing ( closing statement and Call to Action)
         Create a cover letter that is professional and engaging, without having typical AI generated influences. Ensure all categories are covered.
         Ensure the cover letter is generated in the language of the job description.
+        {feedback}
         """
 
+    def create_cover_letter(self, requirements, nice_to_haves, experiences,) -> AIResponse:
+        """Generate a response using the validated query and supplementary documents."""
+        print("Creating draft cover letter")
+        context = self.cover_letter_context(requirements, nice_to_haves, experiences)
 
-        # Generate response from LLM
+        # Generate response from LLM (not cached: drafts should vary between attempts)
         structured_llm = self.llm.with_structured_output(AIResponse)
-        response = structured_llm.invoke([SystemMessage(content=prompt_with_docs)])
+        response = structured_llm.invoke([SystemMessage(content=self._cover_letter_prompt(context))])
         assert isinstance(response, AIResponse), "Response is not of type AIResponse on Generation"
-        print(f"Response time = {response.time_taken}, tokens: {response.token_count}")
         return response
 
+    async def acreate_cover_letter(self, requirements, nice_to_haves, experiences,
+                                   structured_job_description:DataJobDescription|None=None) -> AIResponse:
+        """Async version of create_cover_letter; pass the job description to run applications concurrently."""
+        context = self.cover_letter_context(requirements, nice_to_haves, experiences, structured_job_description)
+        response = await self.llm.with_structured_output(AIResponse).ainvoke(
+            [SystemMessage(content=self._cover_letter_prompt(context))])
+        assert isinstance(response, AIResponse), "Response is not of type AIResponse on Generation"
+        return response
 
-    def evaluate_cover_letter(self, cover_letter) -> EvaluateCoverLetter:
-        "Evaluate the chances of getting the job based on the cover letter draft"
-        print("Evaluating draft")
-        prompt_with_info = f"""
-        Evaluate the enhanced cover letter {cover_letter} from the aspect of the company looking for someone to fill the job with the following description {self.job_description}
+    def _evaluation_prompt(self, cover_letter:str, job_description:str|None=None) -> str:
+        """ prompt for scoring a cover letter against the (budgeted) job description """
+        job_description = self.context_builder.truncate(job_description or self.job_description,
+                                                        self.context_builder.budgets["job_description"])
+        return f"""
+        Evaluate the enhanced cover letter {cover_letter} from the aspect of the company looking for someone to fill the job with the following description {job_description}
         
         using a continuous score between 0 and 1 accurate to 3 decimal places. If there are no requirements for a certain category return 1
         The evaluation should include the following fields:
@@ -142,57 +190,73 @@ class LangChainHandler:
         10. Result (product of all the above fields as percentage)
         """
 
+    def evaluate_cover_letter(self, cover_letter) -> EvaluateCoverLetter:
+        "Evaluate the chances of getting the job based on the cover letter draft"
+        print("Evaluating draft")
         # Generate response from LLM
-        structured_llm = self.llm.with_structured_output(EvaluateCoverLetter)
-        response = structured_llm.invoke([SystemMessage(content=prompt_with_info)])
+        response = llm_cache.invoke(self.llm, EvaluateCoverLetter,
+                                    [SystemMessage(content=self._evaluation_prompt(cover_letter))])
+        self._print_evaluation(response)
+        return response
+
+    async def aevaluate_cover_letter(self, cover_letter, job_description:str|None=None) -> EvaluateCoverLetter:
+        """Async version of evaluate_cover_letter, against the given (or the handler's) job description."""
+        prompt = self._evaluation_prompt(cover_letter, job_description)
+        response = await llm_cache.ainvoke(self.llm, EvaluateCoverLetter, [SystemMessage(content=prompt)])
+        self._print_evaluation(response)
+        return response
+
+    @staticmethod
+    def _print_evaluation(response:EvaluateCoverLetter) -> None:
         print(f"Response generated: Chances of getting the job:  %")
         for field in response.__fields_set__:
             print(f"{field}: {getattr(response, field)}")
-        return response
 
     def create_profile_summary(self) -> str:
-        """create an improved cover letter based on results from the first draft"""
+        """profile summary over all exported documents, reused / updated incrementally (see ProfileSummary)"""
         print("creating profile summary")
-
-        prompt_with_info = f"""
-        using the {self.documents}, create a comprehensive summary of the profile.
-        Highlight experience, skills, education, and any other relevant information relevant to a job application.
-        """
-
-        # Generate response from LLM
-
-        profile_summary = self.llm.invoke([SystemMessage(content=prompt_with_info)])
-
-
-        return profile_summary.content
+        self.profile_summary = ProfileSummary(self.llm).get(DocumentExport().iter_documents())
+        return self.profile_summary
 
     def match_for_jobs(self, job_description:str) -> Match:
         """evaluate match based on structured job description and profile"""
-        system_prompt =f"""
-        Evaluate how much the profile summary matches the job description {job_description}
+        match = llm_cache.invoke(self.llm, Match, [SystemMessage(content=self._match_prompt(job_description))])
+        return match
+
+    async def amatch_for_jobs(self, job_description:str) -> Match:
+        """async version of match_for_jobs"""
+        return await llm_cache.ainvoke(self.llm, Match, [SystemMessage(content=self._match_prompt(job_description))])
+
+    def _match_prompt(self, job_description:str) -> str:
+        """ prompt for the profile / job match score """
+        return f"""
+        Evaluate how much the profile summary {self.profile_summary} matches the job description {job_description}
         i.e 
         Hard skills, experience, soft skills etc.
         Give the response back as a percentage in the range of 0 to 100 (int)
         """
-        structured_llm = self.llm.with_structured_output(Match)
-        match = structured_llm.invoke([SystemMessage(content=system_prompt)])
-        return match
 
+    def match_and_extract(self, job_description:str) -> MatchedJobDescription:
+        """match score and structured job description in a single call"""
+        return llm_cache.invoke(self.llm, MatchedJobDescription,
+                                [SystemMessage(content=self._match_and_extract_prompt(job_description))])
 
-    @staticmethod
-    def _load_documents()->dict|None:
-        print("Loading documents")
-        """Load assistant guidelines from file."""
-        project_root = Path(__file__).parent.parent
-        doc_path = project_root / "files" / "documents.json"
-        print(doc_path)
-        try:
-            with open(doc_path, "r") as file:
-                return json.load(file)
+    async def amatch_and_extract(self, job_description:str) -> MatchedJobDescription:
+        """
+        async version of match_and_extract, stateless and safe to run concurrently;
+        the client does not retry, wrap the call in with_backoff
+        """
+        return await llm_cache.ainvoke(self.llm_without_retries, MatchedJobDescription,
+                                       [SystemMessage(content=self._match_and_extract_prompt(job_description))])
+
+    def _match_and_extract_prompt(self, job_description:str) -> str:
+        """ extraction prompt plus the match score against the profile summary """
+        return f"""
+        {self._job_description_prompt(job_description)}
+        In addition, evaluate how much the profile summary {self.profile_summary} matches this job description
+        (hard skills, experience, soft skills etc.) and return it as match, a percentage in the range of 0 to 100 (int).
+        """
 
-        except Exception as e:
-            print(f"Error loading documents: {e}")
-            return None
 
     @staticmethod
     def _load_job_description()->str|None:
@@ -225,36 +289,21 @@ class LangChainHandler:
 
     def main(self):
         """one function to rule them all"""
-        self.documents = self._load_documents()
+        self.create_profile_summary()
         self.job_description = self._load_job_description()
         self.extract_key_data_from_job_description()
 
         requirements, nice_to_haves, experiences = self.retrieve_from_vector_store()
-        draft_response:AIResponse = self.create_cover_letter(requirements, nice_to_haves, experiences)
-        cover_letter_evaluation= 0
-        counter =0
-        draft_str = ""
-        while cover_letter_evaluation < 0.8 and counter < 3:
-            counter += 1
-            draft_str = self.create_cover_letter_file(draft_response)
-            evaluation_summary    = self.evaluate_cover_letter(draft_str)
-            cover_letter_evaluation = evaluation_summary.result
-
-        with DBHandler() as db:
-            db.store_resume_to_file(draft_str, type_name="cover_letter")
-
-        with DBHandler() as db:
-            db.store_resume_to_file(self.profile_summary, type_name="profile_summary")
+        best = CoverLetterRefiner(self).run(requirements, nice_to_haves, experiences)
+        draft_str = best.text
 
-    @staticmethod
-    def _vector_store_documents() -> PGVector:
-        """creates a vector store for the documents"""
-        load_dotenv()
-        connection_string = os.getenv("DATABASE_URL")
-        return PGVector(connection=connection_string,
-            collection_name="chat_history", use_jsonb=True,
-            embeddings=EmbeddingFunctionWrapper(
-                "all-MiniLM-L6-v2"), )
+        DBHandler.store_resume_to_file(draft_str, type_name="cover_letter")
+        DBHandler.store_resume_to_file(self.profile_summary, type_name="profile_summary")
+
+    @property
+    def vector_store(self) -> PGVector | LocalVectorStore:
+        """the process-wide vector store, connected (and the embedding model loaded) on first use"""
+        return get_vector_store()
 
     def add_to_vector_store_documents(self, split_docs: List[Document]) -> None:
         """Embeds and stores the user query and AI response into the vector store."""
@@ -264,41 +313,84 @@ class LangChainHandler:
             documents=split_docs,
         )
 
+    def batch_similarity_search(self, vectors:npt.NDArray[np.float32], k:int=5) -> List[List[Tuple[Document, float]]]:
+        """Top-k (document, similarity) per query vector, in a single lookup."""
+        with tracer.span("vector.search", queries=len(vectors), k=k):
+            if isinstance(self.vector_store, LocalVectorStore):
+                return self.vector_store.similarity_search_with_score_by_vectors(vectors, k=k)
+            return pgvector_batch_search(get_engine(), COLLECTION_NAME, vectors, k)
+
+    async def abatch_similarity_search(self, vectors:npt.NDArray[np.float32], k:int=5
+                                       ) -> List[List[Tuple[Document, float]]]:
+        """Async version of batch_similarity_search; PGVector is queried over the async (psycopg 3) engine."""
+        with tracer.span("vector.search", queries=len(vectors), k=k):
+            store = await asyncio.to_thread(get_vector_store)
+            if isinstance(store, LocalVectorStore):
+                return await asyncio.to_thread(store.similarity_search_with_score_by_vectors, vectors, k)
+            return await apgvector_batch_search(get_async_engine(), COLLECTION_NAME, vectors, k)
+
+    @staticmethod
+    def _split_fragments(text:str) -> List[str]:
+        return [fragment.strip() for fragment in (text or "").split(",") if fragment.strip()]
+
+    def retrieve_grouped(self, facets:Dict[str, List[str]], k:int=5) -> Dict[str, List[Tuple[Document, float]]]:
+        """
+        Embed the fragments of all facets in one encode call, run one multi-query lookup and
+        return per facet the matched documents, deduplicated (best score kept) and sorted by similarity.
+        """
+        fragments = [fragment for fragment_list in facets.values() for fragment in fragment_list]
+        results = []
+        if fragments:
+            results = self.batch_similarity_search(get_embeddings().encode(fragments), k=k)
+        return self._group_matches(facets, results)
+
+    async def aretrieve_grouped(self, facets:Dict[str, List[str]], k:int=5) -> Dict[str, List[Tuple[Document, float]]]:
+        """Async version of retrieve_grouped; encoding runs in a worker thread."""
+        fragments = [fragment for fragment_list in facets.values() for fragment in fragment_list]
+        results = []
+        if fragments:
+            vectors = await asyncio.to_thread(get_embeddings().encode, fragments)
+            results = await self.abatch_similarity_search(vectors, k=k)
+        return self._group_matches(facets, results)
+
+    @staticmethod
+    def _group_matches(facets:Dict[str, List[str]], results:List[List[Tuple[Document, float]]]
+                       ) -> Dict[str, List[Tuple[Document, float]]]:
+        """
+        per facet: the matches of its fragments, best first, one per source document (chunks of the same
+        document collapse to their best scoring one)
+        """
+        labels = [facet for facet, fragments in facets.items() for _ in fragments]
+        grouped = {facet: {} for facet in facets}
+        for facet, matches in zip(labels, results):
+            for document, score in matches:
+                doc_id = document.metadata.get("doc_id")
+                key = f"doc:{doc_id}" if doc_id is not None else document.id or document.page_content
+                if key not in grouped[facet] or grouped[facet][key][1] < score:
+                    grouped[facet][key] = (document, score)
+        return {facet: sorted(matches.values(), key=lambda match: match[1], reverse=True)
+                for facet, matches in grouped.items()}
+
+    def _facets(self, structured_job_description:DataJobDescription|None=None) -> Dict[str, List[str]]:
+        """ retrieval fragments per facet of the given (or the handler's) job description """
+        structured_job_description = structured_job_description or self.structured_job_description
+        facets = {
+            "requirements": self._split_fragments(structured_job_description.requirements),
+            "nice_to_haves": self._split_fragments(structured_job_description.nice_to_haves),
+            "experiences": self._split_fragments(structured_job_description.experience_level),
+        }
+        for facet, fragments in facets.items():
+            print(f"{facet}: {fragments}")
+        return facets
+
     def retrieve_from_vector_store(self) -> Tuple[List, List, List]:
-        """Retrieves the most relevant documents from the vector store."""
+        """Retrieves the most relevant documents (with similarity scores) from the vector store."""
         print("Retrieving relevant documents from vector store ...")
-        requirement_results = []
-        nice_to_have_results = []
-        experience_results = []
-        for requirement in self.structured_job_description.requirements.split(","):
-            print(f"Requirement: {requirement}")
-            results = self.vector_store.similarity_search(
-                requirement,
-                k=5,
-            )
-        for nice_to_have in self.structured_job_description.preferred_nice_to_have.split(","):
-            print(f"Nice to have: {nice_to_have}")
-            nice_to_have_results += self.vector_store.similarity_search(
-                nice_to_have,
-                k=5,
-                )
-        for experience in self.structured_job_description.experience_level.split(","):
-            print(f"Experience: {experience}")
-            experience_results += self.vector_store.similarity_search(
-                experience,
-                k=5,
-                )
-
-        return requirement_results, nice_to_have_results, experience_results
-
-class EmbeddingFunctionWrapper(Embeddings):
-    def __init__(self, model_name: str):
-        self.model = SentenceTransformer(model_name)
-
-    def embed_documents(self, texts: list[str]) -> npt.NDArray[np.float32]:
-        # Use the encode method to generate embeddings
-        return self.model.encode(texts, convert_to_tensor=False)
-
-    def embed_query(self, text: str) -> Tensor:
-        # For single query embedding
-        return self.model.encode(text, convert_to_tensor=False)
+        grouped = self.retrieve_grouped(self._facets())
+        return grouped["requirements"], grouped["nice_to_haves"], grouped["experiences"]
+
+    async def aretrieve_from_vector_store(self, structured_job_description:DataJobDescription|None=None
+                                          ) -> Tuple[List, List, List]:
+        """Async version of retrieve_from_vector_store, for the given (or the handler's) job description."""
+        grouped = await self.aretrieve_grouped(self._facets(structured_job_description))
+        return grouped["requirements"], grouped["nice_to_haves"], grouped["experiences"]
@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List, Type, TypeVar
+
+from dotenv import load_dotenv
+from langchain_core.messages import BaseMessage
+from pydantic import BaseModel
+
+T = TypeVar("T", bound=BaseModel)
+
+DEFAULT_TTL_SECONDS = 30 * 24 * 3600
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+class LLMCache:
+    """
+    Persistent cache for structured LLM responses.
+    Keyed on (model, temperature, schema, prompt), stored in a local SQLite file with a TTL
+    and least-recently-used eviction once the stored payloads exceed the size budget.
+    Settings: LLM_CACHE_ENABLED, LLM_CACHE_PATH, LLM_CACHE_TTL (seconds), LLM_CACHE_MAX_BYTES.
+    """
+
+    def __init__(self, path: Path | None = None, ttl: float | None = None, max_bytes: int | None = None):
+        load_dotenv()
+        project_root = Path(__file__).parent.parent
+        self.path = path or Path(os.getenv("LLM_CACHE_PATH", project_root / ".cache" / "llm_cache.sqlite"))
+        self.ttl = ttl if ttl is not None else float(os.getenv("LLM_CACHE_TTL", DEFAULT_TTL_SECONDS))
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv("LLM_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+        self.enabled = os.getenv("LLM_CACHE_ENABLED", "1") != "0"
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """ open the cache database on first use """
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    schema TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )""")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_last_access ON llm_cache (last_access)")
+        return self._connection
+
+    @staticmethod
+    def make_key(llm, schema: Type[BaseModel], messages: List[BaseMessage]) -> str:
+        """ hash of model, temperature, output schema and prompt """
+        key_data = {
+            "model": getattr(llm, "model_name", None) or getattr(llm, "model", None),
+            "temperature": getattr(llm, "temperature", None),
+            "schema": [schema.__name__, schema.model_json_schema()],
+            "prompt": [[message.type, message.content] for message in messages],
+        }
+        return hashlib.sha256(json.dumps(key_data, sort_keys=True, default=str).encode("utf8")).hexdigest()
+
+    def get(self, key: str, schema: Type[T]) -> T | None:
+        """ return the cached response as a validated schema instance, or None """
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute("SELECT payload, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            payload, created_at = row
+            if now - created_at > self.ttl:
+                connection.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                return None
+            connection.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+        try:
+            return schema.model_validate_json(payload)
+        except ValueError:
+            return None
+
+    def put(self, key: str, response: BaseModel) -> None:
+        """ store a response and evict expired / least recently used entries """
+        payload = response.model_dump_json()
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, schema, payload, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, type(response).__name__, payload, len(payload), now, now))
+            self._evict(connection, now)
+
+    def _evict(self, connection: sqlite3.Connection, now: float) -> None:
+        """ drop expired entries, then the least recently used ones beyond the size budget """
+        connection.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,))
+        connection.execute("""
+            DELETE FROM llm_cache WHERE key IN (
+                SELECT key FROM (
+                    SELECT key, SUM(size) OVER (ORDER BY last_access DESC) AS running_size FROM llm_cache
+                ) WHERE running_size > ?
+            )""", (self.max_bytes,))
+
+    def invoke(self, llm, schema: Type[T], messages: List[BaseMessage]) -> T:
+        """ cached llm.with_structured_output(schema).invoke(messages) """
+        if not self.enabled:
+            return llm.with_structured_output(schema).invoke(messages)
+        key = self.make_key(llm, schema, messages)
+        cached = self.get(key, schema)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        self.misses += 1
+        response = llm.with_structured_output(schema).invoke(messages)
+        self.put(key, response)
+        return response
+
+    async def ainvoke(self, llm, schema: Type[T], messages: List[BaseMessage]) -> T:
+        """ cached llm.with_structured_output(schema).ainvoke(messages) """
+        if not self.enabled:
+            return await llm.with_structured_output(schema).ainvoke(messages)
+        key = self.make_key(llm, schema, messages)
+        cached = self.get(key, schema)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        self.misses += 1
+        response = await llm.with_structured_output(schema).ainvoke(messages)
+        self.put(key, response)
+        return response
+
+    def stats(self) -> dict:
+        """ hit / miss counters for this process """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def print_stats(self) -> None:
+        stats = self.stats()
+        print(f"LLM cache: {stats['hits']} hits, {stats['misses']} misses, hit rate {stats['hit_rate']:.0%}")
+
+
+llm_cache = LLMCache()
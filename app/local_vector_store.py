@@ -0,0 +1,216 @@
+import json
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+import numpy.typing as npt
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+
+class LocalVectorStore(VectorStore):
+    """
+    In-process vector store for offline runs.
+    Normalized float32 embeddings are kept in a memory-mapped embeddings.npy, ids / texts / metadata
+    in a metadata.json sidecar. Search is a matrix product plus argpartition, cosine similarity as score.
+    Adding documents with existing ids replaces them.
+    Every change is written through unless it happens inside deferred_writes(), which keeps
+    the changes in a growing in-memory buffer and writes the files once at the end (bulk indexing).
+    """
+
+    def __init__(self, embeddings: Embeddings, directory: Path):
+        self.embedding_function = embeddings
+        self.directory = Path(directory)
+        self.matrix_path = self.directory / "embeddings.npy"
+        self.metadata_path = self.directory / "metadata.json"
+        self._lock = threading.Lock()
+        self._matrix: npt.NDArray[np.float32] | None = None  # the valid rows (memory-mapped or a buffer view)
+        self._buffer: npt.NDArray[np.float32] | None = None  # in-memory rows with spare capacity
+        self._deferred = False
+        self._dirty = False
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._metadatas: List[dict] = []
+        self._positions: dict[str, int] = {}
+        self._load()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding_function
+
+    def _load(self) -> None:
+        """ memory-map the stored matrix and read the sidecar """
+        if not (self.matrix_path.exists() and self.metadata_path.exists()):
+            return
+        self._matrix = np.load(self.matrix_path, mmap_mode="r")
+        with open(self.metadata_path, "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+        self._ids, self._texts, self._metadatas = metadata["ids"], metadata["texts"], metadata["metadatas"]
+        self._positions = {doc_id: position for position, doc_id in enumerate(self._ids)}
+
+    def _save(self) -> None:
+        """ write matrix and sidecar to temporary files, then swap them in """
+        matrix = self._matrix
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_matrix = self.matrix_path.with_suffix(".tmp.npy")
+        stored = np.lib.format.open_memmap(tmp_matrix, mode="w+", dtype=np.float32, shape=matrix.shape)
+        stored[:] = matrix
+        stored.flush()
+        del stored
+        tmp_metadata = self.metadata_path.with_suffix(".tmp")
+        with open(tmp_metadata, "w", encoding="utf-8") as f:
+            json.dump({"ids": self._ids, "texts": self._texts, "metadatas": self._metadatas}, f, ensure_ascii=False)
+        os.replace(tmp_matrix, self.matrix_path)
+        os.replace(tmp_metadata, self.metadata_path)
+        self._matrix = np.load(self.matrix_path, mmap_mode="r")
+        self._buffer = None
+        self._dirty = False
+
+    def _changed(self) -> None:
+        """ write the change through, or leave it for the end of deferred_writes() """
+        self._dirty = True
+        if not self._deferred:
+            self._save()
+
+    @contextmanager
+    def deferred_writes(self):
+        """ collect all changes in memory and write the files once when the block ends """
+        with self._lock:
+            self._deferred = True
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._deferred = False
+                if self._dirty:
+                    self._save()
+
+    def _rows_for(self, extra: int, dimension: int) -> npt.NDArray[np.float32]:
+        """ in-memory matrix with room for extra rows; copied from the memory map once, capacity doubles """
+        count = len(self._ids)
+        if self._buffer is None:
+            self._buffer = np.array(self._matrix) if self._matrix is not None \
+                else np.empty((0, dimension), dtype=np.float32)
+        if count + extra > len(self._buffer):
+            grown = np.empty((max(count + extra, 2 * len(self._buffer)), dimension), dtype=np.float32)
+            grown[:count] = self._buffer[:count]
+            self._buffer = grown
+        return self._buffer
+
+    @staticmethod
+    def _normalize(vectors) -> npt.NDArray[np.float32]:
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        ids = [doc_id or str(uuid.uuid4()) for doc_id in (ids or [None] * len(texts))]
+        vectors = self._normalize(self.embedding_function.embed_documents(texts))
+
+        with self._lock:
+            rows = self._rows_for(len(texts), vectors.shape[1])
+            for doc_id, text, metadata, vector in zip(ids, texts, metadatas, vectors):
+                position = self._positions.get(doc_id)
+                if position is None:
+                    position = self._positions[doc_id] = len(self._ids)
+                    self._ids.append(doc_id)
+                    self._texts.append(text)
+                    self._metadatas.append(metadata or {})
+                else:
+                    self._texts[position] = text
+                    self._metadatas[position] = metadata or {}
+                rows[position] = vector
+            self._matrix = rows[:len(self._ids)]
+            self._changed()
+        return ids
+
+    def add_documents(self, documents: List[Document], **kwargs: Any) -> List[str]:
+        ids = kwargs.pop("ids", None) or [document.id for document in documents]
+        return self.add_texts([document.page_content for document in documents],
+                              [document.metadata for document in documents], ids=ids, **kwargs)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids or self._matrix is None:
+            return False
+        with self._lock:
+            drop = {self._positions[doc_id] for doc_id in ids if doc_id in self._positions}
+            if not drop:
+                return False
+            keep = [position for position in range(len(self._ids)) if position not in drop]
+            self._matrix = np.array(self._matrix[keep])
+            self._buffer = None
+            self._ids = [self._ids[position] for position in keep]
+            self._texts = [self._texts[position] for position in keep]
+            self._metadatas = [self._metadatas[position] for position in keep]
+            self._positions = {doc_id: position for position, doc_id in enumerate(self._ids)}
+            self._changed()
+        return True
+
+    def metadata_values(self, key: str) -> dict[str, Any]:
+        """ id -> metadata[key] for every stored vector """
+        return {doc_id: metadata.get(key) for doc_id, metadata in zip(self._ids, self._metadatas)}
+
+    def delete_collection(self) -> None:
+        """ remove all stored vectors """
+        with self._lock:
+            for path in (self.matrix_path, self.metadata_path):
+                path.unlink(missing_ok=True)
+            self._matrix = self._buffer = None
+            self._dirty = False
+            self._ids, self._texts, self._metadatas, self._positions = [], [], [], {}
+
+    def similarity_search_with_score_by_vectors(self, vectors, k: int = 4
+                                                ) -> List[List[Tuple[Document, float]]]:
+        """ top-k (document, cosine similarity) for each query vector, one matrix product for all """
+        queries = self._normalize(vectors)
+        if self._matrix is None or len(self._ids) == 0:
+            return [[] for _ in queries]
+        scores = self._matrix @ queries.T  # (documents, queries)
+        k = min(k, scores.shape[0])
+        top = np.argpartition(-scores, k - 1, axis=0)[:k]
+        results = []
+        for column in range(queries.shape[0]):
+            candidates = top[:, column]
+            ranked = candidates[np.argsort(-scores[candidates, column])]
+            results.append([
+                (Document(id=self._ids[row], page_content=self._texts[row], metadata=self._metadatas[row]),
+                 float(scores[row, column]))
+                for row in ranked
+            ])
+        return results
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4,
+                                               **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vectors([embedding], k)[0]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [document for document, _ in self.similarity_search_with_score_by_vector(embedding, k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self.embedding_function.embed_query(query), k)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [document for document, _ in self.similarity_search_with_score(query, k)]
+
+    def _select_relevance_score_fn(self):
+        return lambda score: score
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   *, directory: Path, ids: Optional[List[str]] = None, **kwargs: Any) -> "LocalVectorStore":
+        store = cls(embedding, directory)
+        store.add_texts(texts, metadatas, ids=ids)
+        return store
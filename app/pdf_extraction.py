@@ -0,0 +1,109 @@
+import asyncio
+import os
+from concurrent.futures import Executor
+from functools import lru_cache
+from typing import List
+
+import pymupdf
+from dotenv import load_dotenv
+from pydantic import BaseModel
+
+from app.instrumentation import tracer
+
+DEFAULT_MAX_PAGES = 20
+DEFAULT_OCR_LANGUAGE = "deu+eng"
+DEFAULT_OCR_DPI = 300
+MIN_PAGE_CHARS = 20  # less text than this on a page with images: treat it as a scan
+
+
+class ExtractedPages(BaseModel):
+    """ text layer of a PDF, with the pages that only carry an image """
+    pages: List[str]
+    image_pages: List[int]
+    page_count: int
+
+
+def read_pages(pdf_path: str, max_pages: int) -> ExtractedPages:
+    """
+    Text of the first max_pages pages and the indices of image-only pages.
+    Module level so it can run in a process pool.
+    """
+    with pymupdf.open(pdf_path) as doc:
+        pages, image_pages = [], []
+        for number in range(min(doc.page_count, max_pages)):
+            page = doc[number]
+            text = page.get_text()
+            if len(text.strip()) < MIN_PAGE_CHARS and page.get_images():
+                image_pages.append(number)
+            pages.append(text)
+        return ExtractedPages(pages=pages, image_pages=image_pages, page_count=doc.page_count)
+
+
+def ocr_page(pdf_path: str, number: int, language: str, dpi: int) -> str:
+    """ OCR one page with Tesseract (through PyMuPDF). Module level so it can run in a process pool. """
+    with pymupdf.open(pdf_path) as doc:
+        page = doc[number]
+        textpage = page.get_textpage_ocr(language=language, dpi=dpi, full=True)
+        return page.get_text(textpage=textpage)
+
+
+@lru_cache(maxsize=1)
+def ocr_available() -> bool:
+    try:
+        pymupdf.get_tessdata()
+        return True
+    except RuntimeError:
+        return False
+
+
+class PDFTextExtractor:
+    """
+    Text extraction for the ingestion pipeline.
+    The text layer is read directly; only image-only pages (scanned certificates) are sent to OCR,
+    one task per page, so a scanned file spreads over the worker pool instead of blocking one worker.
+    Documents longer than max_pages are cut off (long course PDFs repeat the same boilerplate).
+    OCR needs a local Tesseract install; without it image-only pages stay empty.
+    Settings: PDF_MAX_PAGES, PDF_OCR_ENABLED, PDF_OCR_LANGUAGE, PDF_OCR_DPI.
+    """
+
+    def __init__(self, max_pages: int | None = None):
+        load_dotenv()
+        self.max_pages = max_pages or int(os.getenv("PDF_MAX_PAGES", DEFAULT_MAX_PAGES))
+        self.ocr_language = os.getenv("PDF_OCR_LANGUAGE", DEFAULT_OCR_LANGUAGE)
+        self.ocr_dpi = int(os.getenv("PDF_OCR_DPI", DEFAULT_OCR_DPI))
+        self.ocr_enabled = os.getenv("PDF_OCR_ENABLED", "1") != "0"
+        if self.ocr_enabled and not ocr_available():
+            print("Tesseract not found, image-only PDF pages will not be OCRed")
+            self.ocr_enabled = False
+
+    def _report(self, pdf_path: str, extracted: ExtractedPages) -> None:
+        if extracted.page_count > self.max_pages:
+            print(f"{os.path.basename(pdf_path)}: only the first {self.max_pages} of {extracted.page_count} pages used")
+        if extracted.image_pages and not self.ocr_enabled:
+            print(f"{os.path.basename(pdf_path)}: {len(extracted.image_pages)} image-only pages skipped (no OCR)")
+
+    def extract(self, pdf_path: str) -> str:
+        """ text of a PDF, OCRing image-only pages in this process """
+        with tracer.span("pdf.extract"):
+            extracted = read_pages(pdf_path, self.max_pages)
+        self._report(pdf_path, extracted)
+        if self.ocr_enabled:
+            for number in extracted.image_pages:
+                with tracer.span("pdf.ocr"):
+                    extracted.pages[number] = ocr_page(pdf_path, number, self.ocr_language, self.ocr_dpi)
+        return "\n".join(extracted.pages)
+
+    async def aextract(self, pdf_path: str, pool: Executor) -> str:
+        """ text of a PDF, reading and OCRing pages in the worker pool """
+        loop = asyncio.get_running_loop()
+        with tracer.span("pdf.extract"):
+            extracted = await loop.run_in_executor(pool, read_pages, pdf_path, self.max_pages)
+        self._report(pdf_path, extracted)
+        if self.ocr_enabled and extracted.image_pages:
+            with tracer.span("pdf.ocr", pages=len(extracted.image_pages)):
+                texts = await asyncio.gather(*(
+                    loop.run_in_executor(pool, ocr_page, pdf_path, number, self.ocr_language, self.ocr_dpi)
+                    for number in extracted.image_pages))
+            for number, text in zip(extracted.image_pages, texts):
+                extracted.pages[number] = text
+        return "\n".join(extracted.pages)
@@ -0,0 +1,144 @@
+import re
+import unicodedata
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+from db.schemas import PDFMetadata
+
+CERTIFICATE = "certificate"
+
+# "Course completed by ..." / "Learning Path completed by ..." certificates from LinkedIn Learning
+LINKEDIN_LEARNING = re.compile(
+    r"^(?P<title>.+?)\n(?P<kind>Course|Learning Path) completed by (?P<name>[^\n]+)\n"
+    r"(?P<date>\w{3} \d{1,2}, \d{4}) at [^\n]*?UTC ?(?P<duration>[^\n]*)\n"
+    r".*?Top skills covered\n(?P<skills>.*?)\n(?=The PMI|Program:|Instructional Delivery|Certificate ID|Head of)"
+    r"(?:.*?PDUs/ContactHours: (?P<pdus>[\d.]+))?(?:.*?Certificate ID: ?\n?(?P<certificate_id>[0-9a-f]{16,}))?",
+    re.S)
+COURSERA_COURSE = re.compile(
+    r"^(?P<date>[^\n]+)\n(?P<name>[^\n]+)\n(?P<title>.+?)\nan online non-credit course authorized by "
+    r"(?P<issuer>.+?)\s+and\s+offered\s+through Coursera\nhas successfully completed(?P<honors> with honors)?\n"
+    r".*?Verify at: ?\n?(?P<url>https://coursera\.org/verify/[^\n]+)",
+    re.S)
+COURSERA_PROGRAM = re.compile(
+    r"(?P<date>\w{3} \d{1,2}, \d{4})\n(?P<name>[^\n]+)\nhas successfully completed the online, non-credit "
+    r"(?P<kind>Professional ?\n?Certificate|Specialization)\n(?P<title>.+?)\n"
+    r"(?P<description>(?:In this|The certificate holder|By successfully completing) .*?)\nThe online specialization",
+    re.S)
+# the title of a TÜV certificate comes from its file name, so the file name has to say TÜV
+TUEV_FILE = re.compile("t(?:ü|ue|\ufffd)v", re.I)
+DATE = re.compile(r"(?P<month>\D+?)\s*(?P<day>\d{1,2}),\s*(?P<year>\d{4})")
+# the Coursera footer is extracted with spaces inside words and carries no information
+BOILERPLATE = re.compile(r"^Cou ?rsera h ?as con ?firmed.*$|^th ?eir p ?articip ?ation.*$", re.M)
+
+
+def normalize(text: str) -> str:
+    """
+    Unicode compatibility forms (ligatures, non-breaking spaces), broken 'fi' glyphs, words hyphenated
+    across lines joined, whitespace collapsed, one non-empty line per text line.
+    """
+    text = unicodedata.normalize("NFKC", text)
+    text = re.sub(r"(?<=[a-z])Ó(?=[a-z])", "fi", text)
+    text = re.sub(r"(?<=[a-zäöüß])-[ \t]*\n[ \t]*(?=[a-zäöüß])", "", text)
+    lines = (re.sub(r"[ \t]+", " ", line.replace("\u00ad", "")).strip() for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def flatten(text: str) -> str:
+    return " ".join(text.split())
+
+
+def word_count(text: str) -> int:
+    return len(text.split())
+
+
+def _date(text: str) -> str:
+    """ 'A pr 20,  2025' -> 'Apr 20, 2025' """
+    match = DATE.search(text)
+    if match is None:
+        return flatten(text)
+    return f"{match['month'].replace(' ', '')} {match['day']}, {match['year']}"
+
+
+class PreCleaner:
+    """
+    Deterministic cleaning and classification of recurring certificate templates, so only documents
+    the rules cannot handle are sent to the LLM (and then already normalized).
+    Rules: LinkedIn Learning and Coursera certificates by their text, TÜV certificates by file name
+    (recognized only by their text, they go to the LLM). Titles taken from the text must appear in it contiguously.
+    """
+
+    def __init__(self):
+        self.rules: List[Tuple[str, Callable[[str, str], PDFMetadata | None]]] = [
+            ("LinkedIn Learning", self._linkedin_learning),
+            ("Coursera course", self._coursera_course),
+            ("Coursera program", self._coursera_program),
+            ("TÜV", self._tuev),
+        ]
+
+    @staticmethod
+    def _metadata(title: str, content: str) -> PDFMetadata:
+        return PDFMetadata(title=title, content=content, category=CERTIFICATE, size=word_count(content))
+
+    def _linkedin_learning(self, file_name: str, text: str) -> PDFMetadata | None:
+        match = LINKEDIN_LEARNING.search(text)
+        if match is None:
+            return None
+        title = flatten(match["title"])
+        if title not in flatten(text):
+            return None
+        skills = ", ".join(line for line in match["skills"].split("\n") if line != "•")
+        duration = f" ({match['duration']})" if match["duration"] else ""
+        content = (f"{title}. LinkedIn Learning {match['kind'].lower()} completed by {match['name']} "
+                   f"on {match['date']}{duration}. Top skills covered: {skills}.")
+        if match["pdus"]:
+            content += f" PMI PDUs / contact hours: {match['pdus']}."
+        if match["certificate_id"]:
+            content += f" Certificate ID: {match['certificate_id']}"
+        return self._metadata(title, content)
+
+    def _coursera_course(self, file_name: str, text: str) -> PDFMetadata | None:
+        match = COURSERA_COURSE.search(text)
+        if match is None:
+            return None
+        title = flatten(match["title"])
+        if title not in flatten(text):
+            return None
+        honors = " with honors" if match["honors"] else ""
+        content = (f"{title}. Online non-credit course authorized by {flatten(match['issuer'])}, offered through "
+                   f"Coursera, completed{honors} by {match['name']} on {_date(match['date'])}. "
+                   f"Verify at: {match['url'].replace(' ', '')}")
+        return self._metadata(title, content)
+
+    def _coursera_program(self, file_name: str, text: str) -> PDFMetadata | None:
+        match = COURSERA_PROGRAM.search(text)
+        if match is None:
+            return None
+        kind = flatten(match["kind"])
+        title = flatten(match["title"])
+        description = flatten(match["description"])
+        # a title wrapped over several lines must be taken whole, nothing between it and the description
+        if f"{kind} {title} {description}" not in flatten(text):
+            return None
+        content = (f"{title}. Online non-credit {kind} offered through Coursera, completed by {match['name']} "
+                   f"on {_date(match['date'])}. {description}")
+        return self._metadata(f"{title} {kind}", content)
+
+    def _tuev(self, file_name: str, text: str) -> PDFMetadata | None:
+        if not TUEV_FILE.search(file_name):
+            return None
+        stem = re.sub(r"^[\d_-]+", "", Path(file_name).stem)
+        title = TUEV_FILE.sub("TÜV", stem.replace("_", " ")).strip()
+        return self._metadata(title, flatten(text))
+
+    def clean(self, file_name: str, text: str) -> Tuple[str, PDFMetadata | None]:
+        """
+        Normalized text and, when a rule recognizes the document, its metadata.
+        Metadata None means the document needs the LLM.
+        """
+        text = BOILERPLATE.sub("", normalize(text)).strip()
+        for name, rule in self.rules:
+            metadata = rule(file_name, text)
+            if metadata is not None:
+                print(f"{file_name}: {name} template, cleaned without the LLM")
+                return text, metadata
+        return text, None
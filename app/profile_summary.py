@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Iterable
+
+from dotenv import load_dotenv
+from langchain_core.messages import SystemMessage
+
+from app.hashing import hash_text
+
+DEFAULT_SUMMARY_CONCURRENCY = 4
+
+
+class ProfileSummary:
+    """
+    Profile summary over all exported documents, built map-reduce style:
+    every document is summarized on its own (map, keyed by a hash of its title, category and content),
+    the per-document summaries are then combined into the profile (reduce).
+    The result is stored with a fingerprint of the document set and reused while it matches;
+    when documents change only the new ones are mapped again before the reduce.
+    Settings: PROFILE_SUMMARY_PATH, PROFILE_SUMMARY_CONCURRENCY.
+    """
+
+    def __init__(self, llm, path: Path | None = None, concurrency: int | None = None):
+        load_dotenv()
+        project_root = Path(__file__).parent.parent
+        self.llm = llm
+        self.path = path or Path(os.getenv("PROFILE_SUMMARY_PATH", project_root / ".cache" / "profile_summary.json"))
+        self.concurrency = concurrency or int(os.getenv("PROFILE_SUMMARY_CONCURRENCY", DEFAULT_SUMMARY_CONCURRENCY))
+
+    @staticmethod
+    def document_key(document: dict) -> str:
+        return hash_text(f"{document.get('title')}\n{document.get('category')}\n{document.get('content')}")
+
+    def fingerprint(self, keys: Iterable[str]) -> str:
+        """ identifies the document set and the model that summarized it """
+        model = getattr(self.llm, "model_name", None) or getattr(self.llm, "model", None)
+        digest = hashlib.sha256(str(model).encode("utf8"))
+        for key in sorted(keys):
+            digest.update(key.encode("utf8"))
+        return digest.hexdigest()
+
+    def _read_state(self) -> dict:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"fingerprint": None, "summary": None, "documents": {}}
+
+    def _write_state(self, state: dict) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def _map_prompt(document: dict) -> str:
+        return f"""
+        Summarize the following document from a job applicant's files for use in their profile.
+        Keep every concrete skill, tool, role, employer, date, degree, certificate and achievement, drop everything else.
+        Title: {document.get('title')}
+        Category: {document.get('category')}
+        Content: {document.get('content')}
+        """
+
+    @staticmethod
+    def _reduce_prompt(summaries: list[str]) -> str:
+        documents = "\n\n".join(summaries)
+        return f"""
+        using the following document summaries, create a comprehensive summary of the profile.
+        Highlight experience, skills, education, and any other relevant information relevant to a job application.
+        {documents}
+        """
+
+    def get(self, documents: Iterable[dict]) -> str:
+        """ the profile summary for the given documents, regenerated only as far as they changed """
+        start_time = time.time()
+        state = self._read_state()
+        known = state["documents"]
+        keys, missing = [], {}
+        for document in documents:
+            key = self.document_key(document)
+            keys.append(key)
+            if key not in known and key not in missing:
+                missing[key] = document
+
+        fingerprint = self.fingerprint(keys)
+        if state["summary"] is not None and state["fingerprint"] == fingerprint:
+            print("Profile summary unchanged, reusing it")
+            return state["summary"]
+
+        if missing:
+            print(f"Summarizing {len(missing)} new or changed documents")
+            responses = self.llm.batch([[SystemMessage(content=self._map_prompt(document))]
+                                        for document in missing.values()],
+                                       config={"max_concurrency": self.concurrency})
+            for key, document, response in zip(missing, missing.values(), responses):
+                known[key] = {"title": document.get("title"), "summary": response.content}
+
+        current = dict.fromkeys(keys)
+        documents_state = {key: known[key] for key in current}
+        summaries = [f"{entry['title']}: {entry['summary']}" for entry in documents_state.values()]
+        print(f"Combining {len(summaries)} document summaries into the profile summary")
+        summary = self.llm.invoke([SystemMessage(content=self._reduce_prompt(summaries))]).content
+
+        self._write_state({"fingerprint": fingerprint, "summary": summary, "documents": documents_state})
+        print(f"Profile summary created in {time.time() - start_time:.2f}s")
+        return summary
@@ -0,0 +1,90 @@
+import os
+import threading
+from pathlib import Path
+
+import httpx
+from dotenv import load_dotenv
+from langchain_openai import ChatOpenAI
+from openai import DefaultHttpxClient, DefaultAsyncHttpxClient
+from langchain_postgres import PGVector
+
+from app.db_handler import get_engine
+from app.embeddings import EmbeddingFunctionWrapper
+from app.instrumentation import llm_usage_callback
+from app.local_vector_store import LocalVectorStore
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+EMBEDDING_DIMENSION = 384  # fixed in the HNSW index migration
+COLLECTION_NAME = "chat_history"
+DEFAULT_HTTP_MAX_CONNECTIONS = 50
+DEFAULT_HTTP_KEEPALIVE = 20
+
+_lock = threading.RLock()
+_embeddings: dict[str, EmbeddingFunctionWrapper] = {}
+_chat_models: dict[tuple, ChatOpenAI] = {}
+_vector_store: PGVector | LocalVectorStore | None = None
+_http_clients: tuple[httpx.Client, httpx.AsyncClient] | None = None
+
+
+def get_embeddings(model_name: str = EMBEDDING_MODEL_NAME) -> EmbeddingFunctionWrapper:
+    """ one embedding wrapper (and so one loaded model) per model name and process """
+    with _lock:
+        if model_name not in _embeddings:
+            _embeddings[model_name] = EmbeddingFunctionWrapper(model_name)
+        return _embeddings[model_name]
+
+
+def get_vector_store() -> PGVector | LocalVectorStore:
+    """
+    the shared document vector store, connected on first use.
+    VECTOR_STORE_BACKEND=local selects the in-process store (no database needed),
+    kept under VECTOR_STORE_DIR (default .cache/vector_store/<collection>)
+    """
+    global _vector_store
+    with _lock:
+        if _vector_store is None:
+            load_dotenv()
+            if os.getenv("VECTOR_STORE_BACKEND", "pgvector") == "local":
+                directory = Path(os.getenv("VECTOR_STORE_DIR",
+                                           Path(__file__).parent.parent / ".cache" / "vector_store" / COLLECTION_NAME))
+                print(f"Using local vector store in {directory}")
+                _vector_store = LocalVectorStore(embeddings=get_embeddings(), directory=directory)
+            else:
+                print("Connecting to vector store")
+                _vector_store = PGVector(connection=get_engine(),
+                                         collection_name=COLLECTION_NAME, use_jsonb=True,
+                                         embedding_length=EMBEDDING_DIMENSION,
+                                         embeddings=get_embeddings())
+        return _vector_store
+
+
+def get_http_clients() -> tuple[httpx.Client, httpx.AsyncClient]:
+    """
+    one sync and one async HTTP client (and so one connection pool each) shared by all chat models.
+    Settings: HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE.
+    """
+    global _http_clients
+    with _lock:
+        if _http_clients is None:
+            load_dotenv()
+            limits = httpx.Limits(
+                max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", DEFAULT_HTTP_MAX_CONNECTIONS)),
+                max_keepalive_connections=int(os.getenv("HTTP_MAX_KEEPALIVE", DEFAULT_HTTP_KEEPALIVE)))
+            _http_clients = (DefaultHttpxClient(limits=limits), DefaultAsyncHttpxClient(limits=limits))
+        return _http_clients
+
+
+def get_chat_model(model: str = "gpt-4o-mini", temperature: float = 0.7, **kwargs) -> ChatOpenAI:
+    """
+    shared chat model clients per configuration, all on the shared HTTP clients;
+    every call is reported to the tracer with the token usage from the response
+    """
+    key = (model, temperature, tuple(sorted(kwargs.items())))
+    with _lock:
+        if key not in _chat_models:
+            load_dotenv()
+            http_client, http_async_client = get_http_clients()
+            _chat_models[key] = ChatOpenAI(model=model, temperature=temperature,
+                                            http_client=http_client, http_async_client=http_async_client,
+                                            callbacks=[llm_usage_callback], **kwargs)
+        return _chat_models[key]
@@ -0,0 +1,125 @@
+import os
+import time
+import uuid
+from contextlib import nullcontext
+from datetime import datetime
+from typing import List
+
+from dotenv import load_dotenv
+from langchain.schema import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_postgres import PGVector
+
+from app.db_handler import DBHandler, get_engine
+from app.instrumentation import tracer
+from app.local_vector_store import LocalVectorStore
+from app.registry import get_vector_store, COLLECTION_NAME
+from app.vector_search import pgvector_metadata_values
+from db.models import Documents
+
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 50
+DEFAULT_INDEX_BATCH_SIZE = 512  # chunks per embedding + upsert round
+WATERMARK_NAME = "vector_index"
+CHUNK_NAMESPACE = uuid.UUID("6f1c1a52-6a8e-4c1e-9a55-3f0d2b7c8e41")
+
+
+class VectorIndexer:
+    """
+    Keeps the vector store in step with the Documents table.
+    Rows changed since the last run (updated_on > watermark) are chunked, embedded in large batches
+    and upserted under stable chunk ids (doc_id + chunk number), so re-runs overwrite instead of duplicating.
+    Chunks of documents that no longer exist are removed. Batch size: VECTOR_INDEX_BATCH_SIZE.
+    """
+
+    def __init__(self, batch_size: int | None = None):
+        load_dotenv()
+        self.batch_size = batch_size or int(os.getenv("VECTOR_INDEX_BATCH_SIZE", DEFAULT_INDEX_BATCH_SIZE))
+        self.splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+
+    @staticmethod
+    def chunk_id(doc_id: int, chunk: int) -> str:
+        return str(uuid.uuid5(CHUNK_NAMESPACE, f"{doc_id}:{chunk}"))
+
+    def chunk_document(self, document: Documents) -> List[Document]:
+        """ split a Documents row into vector store documents carrying their source in the metadata """
+        return [
+            Document(id=self.chunk_id(document.doc_id, chunk), page_content=text,
+                     metadata={"doc_id": document.doc_id, "title": document.title,
+                               "category": document.category, "chunk": chunk})
+            for chunk, text in enumerate(self.splitter.split_text(document.content))
+        ]
+
+    @staticmethod
+    def _indexed_doc_ids(store: PGVector | LocalVectorStore) -> dict[str, str | None]:
+        """ chunk id -> source doc_id for everything in the store """
+        if isinstance(store, LocalVectorStore):
+            values = store.metadata_values("doc_id")
+        else:
+            values = pgvector_metadata_values(get_engine(), COLLECTION_NAME, "doc_id")
+        return {chunk_id: None if doc_id is None else str(doc_id) for chunk_id, doc_id in values.items()}
+
+    def prune(self, store: PGVector | LocalVectorStore) -> int:
+        """ delete chunks whose document was removed or replaced """
+        with DBHandler() as db:
+            existing = {str(doc_id) for doc_id in db.document_ids()}
+        stale = [chunk_id for chunk_id, doc_id in self._indexed_doc_ids(store).items()
+                 if doc_id is not None and doc_id not in existing]
+        if stale:
+            store.delete(ids=stale)
+            print(f"Removed {len(stale)} chunks of deleted documents from the vector store")
+        return len(stale)
+
+    @staticmethod
+    def _flush(store: PGVector | LocalVectorStore, chunks: List[Document], watermark: datetime | None) -> None:
+        """ embed + upsert one batch, then move the watermark past the documents it completed """
+        if chunks:
+            with tracer.span("vector.upsert", chunks=len(chunks)):
+                store.add_documents(chunks, ids=[chunk.id for chunk in chunks])
+        if watermark is not None:
+            with DBHandler() as db:
+                db.set_watermark(WATERMARK_NAME, watermark)
+
+    def run(self, rebuild: bool = False) -> int:
+        """
+        Index new and changed documents, or everything with rebuild=True (the collection is
+        emptied first and all rows are streamed). Returns the number of chunks written.
+        """
+        start_time = time.time()
+        store = get_vector_store()
+        if rebuild:
+            print("Rebuilding the vector index from all documents")
+            store.delete_collection()
+            if isinstance(store, PGVector):
+                store.create_collection()
+            with DBHandler() as db:
+                db.clear_watermark(WATERMARK_NAME)
+            since = None
+        else:
+            self.prune(store)
+            with DBHandler() as db:
+                since = db.get_watermark(WATERMARK_NAME)
+
+        documents = chunk_count = 0
+        pending: List[Document] = []
+        newest = None
+        # the local store is written once at the end, so its watermark may only move after that write
+        local = isinstance(store, LocalVectorStore)
+        # the reading session streams rows; watermarks are committed on their own sessions
+        with store.deferred_writes() if local else nullcontext(), DBHandler() as reader:
+            for document in reader.iter_documents(since=since):
+                pending.extend(self.chunk_document(document))
+                newest = document.updated_on
+                documents += 1
+                if len(pending) >= self.batch_size:
+                    self._flush(store, pending, None if local else newest)
+                    chunk_count += len(pending)
+                    pending = []
+            self._flush(store, pending, None if local else newest)
+            chunk_count += len(pending)
+        if local and newest is not None:
+            with DBHandler() as db:
+                db.set_watermark(WATERMARK_NAME, newest)
+
+        print(f"Indexed {chunk_count} chunks from {documents} documents in {time.time() - start_time:.2f}s")
+        return chunk_count
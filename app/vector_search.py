@@ -0,0 +1,98 @@
+from typing import Dict, List, Tuple
+
+import numpy as np
+import numpy.typing as npt
+from langchain_core.documents import Document
+from sqlalchemy import text, TextClause
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+
+def _vector_literal(vector: npt.NDArray[np.float32]) -> str:
+    return "[" + ",".join(f"{value:.7g}" for value in vector) + "]"
+
+
+def _batch_search_sql(query_count: int) -> str:
+    """ one ANN lookup per query vector, all in a single statement """
+    values = ", ".join(f"({idx}, CAST(:q{idx} AS vector))" for idx in range(query_count))
+    return f"""
+        WITH queries (idx, embedding) AS (VALUES {values})
+        SELECT q.idx, e.id, e.document, e.cmetadata, e.distance
+        FROM queries q
+        CROSS JOIN LATERAL (
+            SELECT id, document, cmetadata, embedding <=> q.embedding AS distance
+            FROM langchain_pg_embedding
+            WHERE collection_id = (SELECT uuid FROM langchain_pg_collection WHERE name = :collection)
+            ORDER BY embedding <=> q.embedding
+            LIMIT :k
+        ) e
+        ORDER BY q.idx, e.distance
+    """
+
+
+def pgvector_batch_search(engine: Engine, collection_name: str, vectors: npt.NDArray[np.float32],
+                          k: int, ef_search: int | None = None, exact: bool = False
+                          ) -> List[List[Tuple[Document, float]]]:
+    """
+    Top-k cosine search for many query vectors in one round-trip against the PGVector tables.
+    ef_search overrides the HNSW candidate list size for this call, exact=True bypasses the index.
+    Returns one list of (document, similarity) per query, best first.
+    """
+    if len(vectors) == 0:
+        return []
+    with engine.connect() as connection:
+        for statement in _search_settings(ef_search, exact):
+            connection.execute(statement)
+        rows = connection.execute(text(_batch_search_sql(len(vectors))),
+                                  _batch_search_params(collection_name, vectors, k))
+        return _group_rows(rows, len(vectors))
+
+
+async def apgvector_batch_search(engine: AsyncEngine, collection_name: str, vectors: npt.NDArray[np.float32],
+                                 k: int, ef_search: int | None = None, exact: bool = False
+                                 ) -> List[List[Tuple[Document, float]]]:
+    """ async version of pgvector_batch_search over an async (psycopg 3) engine """
+    if len(vectors) == 0:
+        return []
+    async with engine.connect() as connection:
+        for statement in _search_settings(ef_search, exact):
+            await connection.execute(statement)
+        rows = await connection.execute(text(_batch_search_sql(len(vectors))),
+                                        _batch_search_params(collection_name, vectors, k))
+        return _group_rows(rows, len(vectors))
+
+
+def _search_settings(ef_search: int | None, exact: bool) -> List[TextClause]:
+    settings = []
+    if ef_search is not None:
+        settings.append(text(f"SET LOCAL hnsw.ef_search = {int(ef_search)}"))
+    if exact:
+        settings.append(text("SET LOCAL enable_indexscan = off"))
+    return settings
+
+
+def _batch_search_params(collection_name: str, vectors: npt.NDArray[np.float32], k: int) -> dict:
+    params = {f"q{idx}": _vector_literal(vector) for idx, vector in enumerate(vectors)}
+    params.update(collection=collection_name, k=k)
+    return params
+
+
+def _group_rows(rows, query_count: int) -> List[List[Tuple[Document, float]]]:
+    """ (document, similarity) lists per query index from the batch search rows """
+    results = [[] for _ in range(query_count)]
+    for idx, doc_id, content, metadata, distance in rows:
+        document = Document(id=doc_id, page_content=content, metadata=metadata or {})
+        results[idx].append((document, 1.0 - float(distance)))
+    return results
+
+
+def pgvector_metadata_values(engine: Engine, collection_name: str, key: str) -> Dict[str, str | None]:
+    """ embedding id -> metadata[key] (as text) for every vector in the collection """
+    sql = text("""
+        SELECT e.id, e.cmetadata ->> :key
+        FROM langchain_pg_embedding e
+        JOIN langchain_pg_collection c ON e.collection_id = c.uuid
+        WHERE c.name = :collection
+    """)
+    with engine.connect() as connection:
+        return dict(connection.execute(sql, {"key": key, "collection": collection_name}).all())
@@ -0,0 +1,194 @@
+"""
+Local stand-in for the OpenAI chat completions API, plus fixture job pages for the scraper.
+
+    python -m benchmarks.llm_stub --port 8765 --latency-ms 300 --jitter-ms 100
+
+Point the app at it with OPENAI_BASE_URL=http://127.0.0.1:8765/v1 and any OPENAI_API_KEY.
+Structured output requests (response_format json_schema, or tools / function calling) get a canned
+object built from the requested JSON schema; strings carry a digest of the prompt so different prompts
+give different answers. Plain requests get a short text reply. Usage is estimated from the text lengths.
+GET /jobs/view/<n> serves a synthetic LinkedIn-style job page.
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ECHO_FIELDS = {"content", "summary"}  # string fields that echo part of the prompt, so they have realistic size
+ECHO_CHARS = 1500
+CANNED_INTEGER = 80  # above the scraper's match threshold, so extraction paths are exercised
+CANNED_NUMBER = 0.85
+
+JOB_SKILLS = ["Python", "SQL", "Kubernetes", "team leadership", "stakeholder management", "machine learning",
+              "agile delivery", "cloud architecture", "quality management", "budget ownership", "German", "English"]
+JOB_ROLES = ["Engineering Manager", "Python Developer", "AI Product Owner", "IT Manager", "Data Engineer"]
+
+
+def _resolve(schema: dict, definitions: dict) -> dict:
+    while "$ref" in schema:
+        schema = definitions[schema["$ref"].split("/")[-1]]
+    for key in ("anyOf", "oneOf", "allOf"):
+        if key in schema:
+            options = [option for option in schema[key] if option.get("type") != "null"]
+            return _resolve(options[0], definitions)
+    return schema
+
+
+def canned_value(schema: dict, definitions: dict, name: str, digest: str, prompt: str):
+    """ a schema-conforming value; deterministic for a given prompt """
+    schema = _resolve(schema, definitions)
+    if "enum" in schema:
+        return schema["enum"][0]
+    kind = schema.get("type")
+    if kind == "object":
+        return {key: canned_value(value, definitions, key, digest, prompt)
+                for key, value in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [canned_value(schema.get("items", {}), definitions, name, digest, prompt)]
+    if kind == "integer":
+        return CANNED_INTEGER
+    if kind == "number":
+        return CANNED_NUMBER
+    if kind == "boolean":
+        return True
+    if name in ECHO_FIELDS:
+        return f"{name} {digest}: {' '.join(prompt.split())[-ECHO_CHARS:]}"
+    return f"{name} {digest}"
+
+
+def completion(request: dict) -> dict:
+    """ chat.completion response for a request body """
+    prompt = "\n".join(str(message.get("content") or "") for message in request.get("messages", []))
+    digest = hashlib.sha256(prompt.encode("utf8")).hexdigest()[:12]
+    response_format = request.get("response_format") or {}
+    finish_reason = "stop"
+    message = {"role": "assistant", "content": None, "refusal": None}
+
+    if response_format.get("type") == "json_schema":
+        schema = response_format["json_schema"]["schema"]
+        message["content"] = json.dumps(canned_value(schema, schema.get("$defs", {}), "", digest, prompt))
+    elif request.get("tools"):
+        tool_choice = request.get("tool_choice")
+        name = tool_choice["function"]["name"] if isinstance(tool_choice, dict) else None
+        tool = next((tool for tool in request["tools"] if tool["function"]["name"] == name), request["tools"][0])
+        parameters = tool["function"].get("parameters", {})
+        arguments = canned_value(parameters, parameters.get("$defs", {}), "", digest, prompt)
+        message["tool_calls"] = [{"id": f"call_{digest}", "type": "function",
+                                  "function": {"name": tool["function"]["name"], "arguments": json.dumps(arguments)}}]
+        finish_reason = "tool_calls"
+    elif response_format.get("type") == "json_object":
+        message["content"] = "{}"
+    else:
+        message["content"] = f"Stub response {digest}: {' '.join(prompt.split())[-ECHO_CHARS:]}"
+
+    output = message["content"] or json.dumps(message.get("tool_calls"))
+    prompt_tokens, completion_tokens = len(prompt) // 4 + 1, len(output) // 4 + 1
+    return {
+        "id": f"chatcmpl-{digest}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request.get("model", "stub"),
+        "choices": [{"index": 0, "message": message, "finish_reason": finish_reason, "logprobs": None}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                  "total_tokens": prompt_tokens + completion_tokens},
+    }
+
+
+def job_page(job_number: int) -> str:
+    """ synthetic job detail page in the markup the scraper parses """
+    rng = random.Random(job_number)
+    role = rng.choice(JOB_ROLES)
+    skills = rng.sample(JOB_SKILLS, 5)
+    items = "".join(f"<li>{skill}</li>" for skill in skills)
+    return f"""<html><body><h1>{role}</h1>
+<div class="description__text description__text--rich"><section><div class="show-more-less-html__markup">
+<p>We are looking for a {role} (job {job_number}) to join our growing team.</p>
+<p><strong>Requirements</strong></p><ul>{items}</ul>
+<p>Nice to have: {rng.choice(JOB_SKILLS)}. Remote within Germany, full time.</p>
+</div></section><button>Show more</button></div></body></html>"""
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server: "LLMStubServer"
+
+    def _send(self, status: int, body: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send(404, b'{"error": {"message": "not found"}}', "application/json")
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        time.sleep(self.server.delay())
+        self.server.count_request()
+        self._send(200, json.dumps(completion(request)).encode("utf8"), "application/json")
+
+    def do_GET(self):
+        if self.path.startswith("/jobs/view/"):
+            job_number = int(self.path.rstrip("/").rsplit("/", 1)[-1])
+            self._send(200, job_page(job_number).encode("utf8"), "text/html; charset=utf-8")
+        else:
+            self._send(404, b"not found", "text/plain")
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LLMStubServer(ThreadingHTTPServer):
+    """ threaded stub server with configurable per-request latency """
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0, jitter_ms: float = 0):
+        super().__init__((host, port), StubHandler)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def delay(self) -> float:
+        return max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+
+    def count_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def start(self) -> "LLMStubServer":
+        """ serve in a background thread """
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--jitter-ms", type=float, default=100)
+    args = parser.parse_args()
+    server = LLMStubServer(port=args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms)
+    print(f"LLM stub listening on {server.url}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+Offline end-to-end benchmark of ingestion, retrieval, job matching and cover letter generation.
+
+    python -m benchmarks.pipeline_benchmark --pdfs 20 --jobs 30 --latency-ms 300
+
+All LLM calls go to the local stub (benchmarks/llm_stub.py) with the configured latency, job pages are
+served by the stub as well, the PDFs in processed/ are the fixture corpus and every run works in a fresh
+temporary directory with a SQLite database and the local vector store (pass --database-url for a
+throwaway Postgres, which also switches to PGVector). The embedding model has to be available locally.
+Each stage runs in its own process so peak RSS is per stage. Results are written as JSON to
+benchmarks/results/<timestamp>-<commit>.json.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.llm_stub import LLMStubServer
+
+PROJECT_ROOT = Path(__file__).parent.parent
+FIXTURE_DIR = PROJECT_ROOT / "processed"
+RESULTS_DIR = Path(__file__).parent / "results"
+STAGES = ["ingest", "retrieval", "jobs", "cover_letter"]
+QUERY_FRAGMENTS = ["Python", "project management", "team leadership", "quality management", "machine learning",
+                   "stakeholder communication", "agile methods", "German and English", "budget responsibility",
+                   "mechanical engineering", "AI ethics", "process improvement"]
+
+
+def peak_rss_mb() -> float:
+    """ peak resident set size of this process and its (process pool) children """
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) / 1024  # KiB on Linux
+
+
+def percentiles(latencies: list[float]) -> dict:
+    return {"p50_ms": float(np.percentile(latencies, 50)), "p99_ms": float(np.percentile(latencies, 99)),
+            "mean_ms": float(np.mean(latencies)), "count": len(latencies)}
+
+
+def stage_ingest(args) -> dict:
+    from app.extract_pdf_to_database import CreateRAGData
+
+    to_process = Path("to_process")
+    to_process.mkdir(exist_ok=True)
+    Path("processed").mkdir(exist_ok=True)
+    # spread over the corpus: the (chronologically named) first files are all scanned certificates
+    corpus = sorted(FIXTURE_DIR.glob("*.pdf"))
+    fixtures = corpus[::max(1, len(corpus) // max(args.pdfs, 1))][:args.pdfs]
+    for pdf in fixtures:
+        shutil.copy(pdf, to_process / pdf.name)
+    rag = CreateRAGData()
+    started = time.perf_counter()
+    rag.main(workers=args.workers, llm_concurrency=args.llm_concurrency)
+    seconds = time.perf_counter() - started
+    stages = {stage: {"items": stats["count"], "busy_s": stats["busy"], "wall_s": stats["last"] - stats["first"]}
+              for stage, stats in rag.stage_stats.items()}
+    return {"pdfs": len(fixtures), "seconds": seconds, "pdfs_per_sec": len(fixtures) / seconds, "stages": stages}
+
+
+def stage_retrieval(args) -> dict:
+    from app.langchain_handler import LangChainHandler
+
+    handler = LangChainHandler()
+    queries = [QUERY_FRAGMENTS[idx % len(QUERY_FRAGMENTS)] + f" {idx // len(QUERY_FRAGMENTS)}"
+               for idx in range(args.queries)]
+    handler.retrieve_grouped({"warmup": queries[:1]}, k=args.k)
+
+    single = []
+    for query in queries:
+        started = time.perf_counter()
+        handler.retrieve_grouped({"requirements": [query]}, k=args.k)
+        single.append((time.perf_counter() - started) * 1000)
+
+    grouped = []
+    for start in range(0, len(queries), 10):
+        fragments = queries[start:start + 10]
+        facets = {"requirements": fragments[:5], "nice_to_haves": fragments[5:8], "experiences": fragments[8:]}
+        started = time.perf_counter()
+        handler.retrieve_grouped(facets, k=args.k)
+        grouped.append((time.perf_counter() - started) * 1000)
+    return {"single_query": percentiles(single), "grouped_10_fragments": percentiles(grouped)}
+
+
+def stage_jobs(args) -> dict:
+    from app.jobscrapers.linkedinscraper import LinkedinScraper
+
+    stub_url = os.environ["BENCHMARK_STUB_URL"]
+    scraper = LinkedinScraper()
+    scraper.jobs = [(f"Job {number}", f"{stub_url}/jobs/view/{number}") for number in range(args.jobs)]
+    started = time.perf_counter()
+    asyncio.run(scraper.get_job_info_concurrent(args.llm_concurrency))
+    seconds = time.perf_counter() - started
+    return {"jobs": args.jobs, "seconds": seconds, "jobs_per_sec": args.jobs / seconds}
+
+
+def stage_cover_letter(args) -> dict:
+    from app.langchain_handler import LangChainHandler
+
+    Path("files").mkdir(exist_ok=True)
+    started = time.perf_counter()
+    LangChainHandler().main()
+    return {"seconds": time.perf_counter() - started}
+
+
+def run_stage_here(args) -> None:
+    """ child process: run one stage in the current (benchmark) directory and store its result """
+    result = globals()[f"stage_{args.stage}"](args)
+    result["peak_rss_mb"] = peak_rss_mb()
+    Path("results").mkdir(exist_ok=True)
+    with open(Path("results") / f"{args.stage}.json", "w") as f:
+        json.dump(result, f)
+
+
+def stage_command(stage: str, args) -> list[str]:
+    return [sys.executable, "-m", "benchmarks.pipeline_benchmark", "--stage", stage,
+            "--pdfs", str(args.pdfs), "--jobs", str(args.jobs), "--queries", str(args.queries),
+            "--k", str(args.k), "--llm-concurrency", str(args.llm_concurrency)] + \
+        (["--workers", str(args.workers)] if args.workers else [])
+
+
+def stage_environment(workdir: Path, stub: LLMStubServer, database_url: str | None) -> dict:
+    env = dict(os.environ)
+    env.update(
+        PYTHONPATH=str(PROJECT_ROOT),
+        OPENAI_API_KEY="stub",
+        OPENAI_BASE_URL=f"{stub.url}/v1",
+        OPENAI_API_BASE=f"{stub.url}/v1",
+        BENCHMARK_STUB_URL=stub.url,
+        DATABASE_URL=database_url or f"sqlite:///{workdir / 'benchmark.db'}",
+        VECTOR_STORE_BACKEND="pgvector" if database_url and database_url.startswith("postgresql") else "local",
+        VECTOR_STORE_DIR=str(workdir / "vector_store"),
+        LLM_CACHE_ENABLED="0",
+        EMBEDDING_CACHE_DIR=str(workdir / "embeddings"),
+        PROFILE_SUMMARY_PATH=str(workdir / "profile_summary.json"),
+        DOCUMENT_EXPORT_PATH=str(workdir / "documents.jsonl"),
+        TRACE_LOG_PATH=str(workdir / "trace.jsonl"),
+    )
+    return env
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_summary(results: dict) -> None:
+    print("-" * 60)
+    for stage, result in results["stages"].items():
+        if "error" in result:
+            print(f"{stage:<14} FAILED (see {result['log']})")
+            continue
+        headline = {
+            "ingest": lambda r: f"{r['pdfs_per_sec']:.2f} PDFs/s",
+            "retrieval": lambda r: f"p50 {r['single_query']['p50_ms']:.1f} ms, p99 {r['single_query']['p99_ms']:.1f} ms",
+            "jobs": lambda r: f"{r['jobs_per_sec']:.2f} jobs/s",
+            "cover_letter": lambda r: f"{r['seconds']:.2f} s",
+        }[stage](result)
+        print(f"{stage:<14}{headline:<40}peak RSS {result['peak_rss_mb']:.0f} MB")
+    print("-" * 60)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline pipeline benchmark against a local LLM stub")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--pdfs", type=int, default=20, help="number of fixture PDFs from processed/")
+    parser.add_argument("--jobs", type=int, default=30, help="number of stub job postings")
+    parser.add_argument("--queries", type=int, default=200, help="retrieval queries")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--llm-concurrency", type=int, default=4)
+    parser.add_argument("--latency-ms", type=float, default=300, help="stub latency per LLM call")
+    parser.add_argument("--jitter-ms", type=float, default=100)
+    parser.add_argument("--database-url", default=None, help="throwaway database (default: SQLite in the work dir)")
+    parser.add_argument("--keep", action="store_true", help="keep the work directory")
+    parser.add_argument("--stage", choices=STAGES, help=argparse.SUPPRESS)  # internal: run one stage in-process
+    args = parser.parse_args()
+
+    if args.stage:
+        run_stage_here(args)
+        return
+
+    workdir = Path(tempfile.mkdtemp(prefix="resume_builder_benchmark_"))
+    stub = LLMStubServer(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms).start()
+    env = stage_environment(workdir, stub, args.database_url)
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("stage", "database_url")},
+        "stages": {},
+    }
+    try:
+        for stage in args.stages:
+            print(f"Running stage {stage} ...")
+            requests_before = stub.requests
+            log_path = workdir / f"{stage}.log"
+            with open(log_path, "w") as log:
+                process = subprocess.run(stage_command(stage, args), cwd=workdir, env=env,
+                                         stdout=log, stderr=subprocess.STDOUT)
+            if process.returncode != 0:
+                results["stages"][stage] = {"error": process.returncode, "log": str(log_path)}
+                continue
+            with open(workdir / "results" / f"{stage}.json") as f:
+                results["stages"][stage] = json.load(f)
+            results["stages"][stage]["llm_requests"] = stub.requests - requests_before
+    finally:
+        stub.stop()
+
+    RESULTS_DIR.mkdir(exist_ok=True)
+    output = RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}-{results['commit']}.json"
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print_summary(results)
+    print(f"Results written to {output}")
+    if args.keep or any("error" in result for result in results["stages"].values()):
+        print(f"Work directory: {workdir}")
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
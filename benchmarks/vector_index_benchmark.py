@@ -0,0 +1,78 @@
+"""
+Recall vs latency of the HNSW index compared with exact search on the PGVector collection.
+
+    python -m benchmarks.vector_index_benchmark --queries 200 --k 5 --ef 10 20 40 80 160
+
+Queries are stored chunk embeddings with a little noise added, so they land near but not on
+existing vectors. Recall@k is measured against an exact (sequential scan) search.
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+from sqlalchemy import text
+
+from app.db_handler import get_engine
+from app.registry import COLLECTION_NAME
+from app.vector_search import pgvector_batch_search
+
+
+def sample_queries(count: int, noise: float, seed: int) -> np.ndarray:
+    """ random stored embeddings plus gaussian noise, re-normalized """
+    with get_engine().connect() as connection:
+        rows = connection.execute(text("""
+            SELECT e.embedding::text FROM langchain_pg_embedding e
+            JOIN langchain_pg_collection c ON c.uuid = e.collection_id
+            WHERE c.name = :collection ORDER BY random() LIMIT :count
+        """), {"collection": COLLECTION_NAME, "count": count}).scalars().all()
+    if not rows:
+        raise SystemExit(f"No embeddings in collection {COLLECTION_NAME}")
+    vectors = np.array([np.array(row.strip("[]").split(","), dtype=np.float32) for row in rows])
+    rng = np.random.default_rng(seed)
+    vectors += rng.normal(scale=noise, size=vectors.shape).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def run(queries: np.ndarray, k: int, ef_search: int | None, exact: bool) -> tuple[list[set], list[float]]:
+    """ one round-trip per query, returns result ids and latencies in ms """
+    engine = get_engine()
+    ids, latencies = [], []
+    for vector in queries:
+        started = time.perf_counter()
+        matches = pgvector_batch_search(engine, COLLECTION_NAME, vector[None, :], k,
+                                        ef_search=ef_search, exact=exact)[0]
+        latencies.append((time.perf_counter() - started) * 1000)
+        ids.append({document.id for document, _ in matches})
+    return ids, latencies
+
+
+def percentile(values: list[float], pct: float) -> float:
+    return float(np.percentile(values, pct))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="HNSW recall vs latency benchmark")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--ef", type=int, nargs="+", default=[10, 20, 40, 80, 160])
+    parser.add_argument("--noise", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    queries = sample_queries(args.queries, args.noise, args.seed)
+    run(queries[:5], args.k, None, exact=False)  # warm up the pool and caches
+
+    exact_ids, exact_latencies = run(queries, args.k, None, exact=True)
+    print(f"{'mode':<14}{'recall@' + str(args.k):>10}{'p50 [ms]':>10}{'p95 [ms]':>10}{'mean [ms]':>11}")
+    print(f"{'exact':<14}{1.0:>10.3f}{percentile(exact_latencies, 50):>10.2f}"
+          f"{percentile(exact_latencies, 95):>10.2f}{statistics.mean(exact_latencies):>11.2f}")
+    for ef_search in args.ef:
+        ids, latencies = run(queries, args.k, ef_search, exact=False)
+        recall = statistics.mean(len(found & truth) / max(len(truth), 1) for found, truth in zip(ids, exact_ids))
+        print(f"{'hnsw ef=' + str(ef_search):<14}{recall:>10.3f}{percentile(latencies, 50):>10.2f}"
+              f"{percentile(latencies, 95):>10.2f}{statistics.mean(latencies):>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -16,7 +16,21 @@ class Documents(SQLModel, table=True):
     content: str
     category: str
     size: int
+    content_hash: str | None = Field(default=None, unique=True, index=True)
     created_on: datetime = Field(default_factory=datetime.now)
+    updated_on: datetime = Field(default_factory=datetime.now, index=True)
+
+class IngestionManifest(SQLModel, table=True):
+    manifest_id: int | None = Field(default=None, primary_key=True)
+    file_name: str = Field(unique=True)
+    file_hash: str = Field(index=True)
+    text_hash: str = Field(index=True)
+    doc_id: int | None = Field(default=None, foreign_key="documents.doc_id")
+    processed_on: datetime = Field(default_factory=datetime.now)
+
+class IndexWatermark(SQLModel, table=True):
+    name: str = Field(primary_key=True)
+    watermark: datetime
 
 class Jobs(SQLModel, table=True):
     job_id: int | None = Field(default=None, primary_key=True)
@@ -36,7 +50,7 @@ class Jobs(SQLModel, table=True):
     company_industry: str
     summary: str
     match:int
-    job_url: str
+    job_url: str = Field(unique=True, index=True)
     applied:datetime = Field(sa_column=(Column(String, nullable=True)))
     status:ApplicationStatus = Field(sa_column=Column(SQLEnum(ApplicationStatus),
                                                       default=ApplicationStatus.PENDING))
\ No newline at end of file
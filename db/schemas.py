@@ -16,9 +16,6 @@ class AIResponse(BaseModel):
     cl_motivation: str = Field(description="Motivation for applying. (Why You Want to Work for the Company)")
     cl_closing: str = Field(description="The closing statement of the cover letter. (Call to Action)")
 
-    time_taken: str = Field(description="Time taken to generate the response.")
-    token_count: int = Field(description="Number of tokens used in the response.")
-
 class EvaluateCoverLetter(BaseModel):
     """Response model for the LangChainHandler."""
     skill_match:float = Field(description="Evaluation of the skill match value between the candidate and the job description.")
@@ -56,6 +53,15 @@ class Match(BaseModel):
     match:int = Field(description="Match value between the candidate and the job description.")
 
 
+class MatchedJobDescription(DataJobDescription):
+    """Job description fields and the profile match, extracted in one call."""
+    match: int = Field(description="Match value between the candidate profile and the job description (0 to 100).")
+
+    def split(self) -> tuple[DataJobDescription, Match]:
+        """the (job description, match) pair the job tables are written from"""
+        return DataJobDescription.model_validate(self.model_dump(exclude={"match"})), Match(match=self.match)
+
+
 class PDFMetadata(BaseModel):
     title: str
     content: str
@@ -1,14 +1,37 @@
-from app.extract_pdf_to_database import CreateRAGData
+import argparse
+
+from app.extract_pdf_to_database import CreateRAGData, DEFAULT_LLM_CONCURRENCY
 from app.langchain_handler import LangChainHandler
+from app.db_handler import dispose_engine
+from app.instrumentation import tracer
+
+
 
+def parse_args():
+    """command line options"""
+    parser = argparse.ArgumentParser(description="Resume builder")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="process pool size for PDF text extraction (default: number of CPUs)")
+    parser.add_argument("--llm-concurrency", type=int, default=DEFAULT_LLM_CONCURRENCY,
+                        help="maximum number of concurrent LLM cleaning calls")
+    parser.add_argument("--rebuild-index", action="store_true",
+                        help="re-embed and re-export all documents instead of only new / changed ones")
+    return parser.parse_args()
 
 
 def main():
     """call everything from here"""
-    data = CreateRAGData()
-    data.main()
-    ai_handler = LangChainHandler()
-    ai_handler.main()
+    args = parse_args()
+    try:
+        with tracer.span("ingest"):
+            data = CreateRAGData()
+            data.main(workers=args.workers, llm_concurrency=args.llm_concurrency, rebuild_index=args.rebuild_index)
+        with tracer.span("cover_letter"):
+            ai_handler = LangChainHandler()
+            ai_handler.main()
+    finally:
+        dispose_engine()
+        tracer.print_summary()
 
 
 
@@ -0,0 +1,24 @@
+import pytest
+
+from app import db_handler
+
+
+def test_ensure_schema_retries_after_a_failed_create(monkeypatch):
+    calls = []
+
+    def create_all(engine):
+        calls.append(engine)
+        if len(calls) == 1:
+            raise ConnectionError("database not up yet")
+
+    monkeypatch.setattr(db_handler, "_schema_created", False)
+    monkeypatch.setattr(db_handler, "get_engine", lambda: "engine")
+    monkeypatch.setattr(db_handler.SQLModel.metadata, "create_all", create_all)
+    monkeypatch.delenv("DB_CREATE_SCHEMA", raising=False)
+
+    with pytest.raises(ConnectionError):
+        db_handler.ensure_schema()
+    db_handler.ensure_schema()
+    db_handler.ensure_schema()
+
+    assert calls == ["engine", "engine"]
@@ -0,0 +1,18 @@
+from app.job_urls import normalize_job_url
+
+CANONICAL = "https://www.linkedin.com/jobs/view/123"
+
+
+def test_bare_and_locale_linkedin_hosts_map_to_www():
+    assert normalize_job_url("https://linkedin.com/jobs/view/123") == CANONICAL
+    assert normalize_job_url("https://de.linkedin.com/jobs/view/123/") == CANONICAL
+    assert normalize_job_url("http://WWW.LinkedIn.com/jobs/view/123") == CANONICAL
+
+
+def test_tracking_parameters_and_fragment_are_dropped():
+    url = "https://www.linkedin.com/jobs/view/123?refId=abc&trackingId=x%3D&utm_source=mail&keep=1#top"
+    assert normalize_job_url(url) == CANONICAL + "?keep=1"
+
+
+def test_other_hosts_keep_their_subdomain():
+    assert normalize_job_url("https://jobs.example.com/posting/9/") == "https://jobs.example.com/posting/9"
@@ -0,0 +1,30 @@
+from langchain_core.documents import Document
+
+from app.langchain_handler import LangChainHandler
+
+
+def chunk(chunk_id: str, doc_id: int | None, text: str) -> Document:
+    metadata = {} if doc_id is None else {"doc_id": doc_id, "chunk": int(chunk_id[-1])}
+    return Document(id=chunk_id, page_content=text, metadata=metadata)
+
+
+def test_group_matches_collapses_chunks_of_one_document():
+    facets = {"requirements": ["python", "sql"], "experiences": []}
+    results = [
+        [(chunk("c1", 7, "Python certificate, part 1"), 0.9), (chunk("c2", 7, "Python certificate, part 2"), 0.8)],
+        [(chunk("c2", 7, "Python certificate, part 2"), 0.95), (chunk("c3", 8, "SQL course"), 0.7)],
+    ]
+
+    grouped = LangChainHandler._group_matches(facets, results)
+
+    assert [(document.id, score) for document, score in grouped["requirements"]] == [("c2", 0.95), ("c3", 0.7)]
+    assert grouped["experiences"] == []
+
+
+def test_group_matches_falls_back_to_the_chunk_id_without_doc_id():
+    facets = {"requirements": ["python"]}
+    results = [[(chunk("c1", None, "same text"), 0.6), (chunk("c2", None, "same text"), 0.5)]]
+
+    grouped = LangChainHandler._group_matches(facets, results)
+
+    assert [document.id for document, _ in grouped["requirements"]] == ["c1", "c2"]
@@ -0,0 +1,14 @@
+from app.pdf_precleaner import PreCleaner
+
+TUEV_TEXT = "TÜV Rheinland\nZertifikat\nMax Mustermann\nhat an der Schulung QM-Beauftragter erfolgreich teilgenommen"
+
+
+def test_tuev_certificate_is_titled_from_its_file_name():
+    _, metadata = PreCleaner().clean("2017_QM-B_Tuev.pdf", TUEV_TEXT)
+    assert metadata is not None
+    assert metadata.title == "QM-B TÜV"
+
+
+def test_tuev_text_without_tuev_file_name_goes_to_the_llm():
+    _, metadata = PreCleaner().clean("Scan 0012.pdf", TUEV_TEXT)
+    assert metadata is None